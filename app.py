@@ -1,21 +1,50 @@
 # Import necessary libraries
 import threading
+import queue
 import uuid
-import re
+import hashlib
+import time
 import concurrent.futures
-import ast
 import dash
+import flask
 import requests
-from PIL import Image, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image, ImageFile, UnidentifiedImageError
 import io
+import os
+import csv
+import tempfile
 import base64
 import pandas as pd
-import numpy as np
+try:
+    # Optional: pyarrow parses CSV blocks on multiple threads; pandas is used when it's missing
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
 import response_to_delta_table
 # Import dash_bootstrap_components first to ensure its CSS loads before potential custom styles
 import dash_bootstrap_components as dbc
 from dash import dcc, html, Input, Output, State, callback # Import directly
 from datetime import datetime
+from collections import OrderedDict, ChainMap
+import logging
+import logging.handlers
+import atexit
+
+# Log records are formatted and written by a background listener thread, so bulk worker
+# threads only enqueue them instead of blocking on stdout. Per-row traces are DEBUG;
+# set LOG_LEVEL=DEBUG in the environment to see them.
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
 # Assuming tavily_extract and claude are in a 'resources' subfolder
 # If they are in the same directory, change imports back
 try:
@@ -23,18 +52,189 @@ try:
     from .resources import tavily_extract # Import Tavily client
     from .resources import claude         # Import Claude client
 except ImportError:
-    print("Could not import from 'resources' using relative path. Trying direct import...")
+    logger.info("Could not import from 'resources' using relative path. Trying direct import...")
     try:
         import tavily_extract
         import claude
     except ImportError as e:
-         print(f"Failed to import tavily_extract or claude: {e}")
+         logger.error("Failed to import tavily_extract or claude: %s", e)
          # Set them to None to handle gracefully in the callback
          tavily_extract = None
          claude = None
+try:
+    # Optional: SQLite-backed cache that keeps search results across restarts
+    from resources import llm_cache
+except ImportError:
+    llm_cache = None
+
+# Sentinel for cache lookups where None is a legitimate value
+_MISSING = object()
+
+class _TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after they are stored.
+    Once `maxsize` entries are held, the least recently used entry is evicted.
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+# Tracks progress for each upload (per user session). Entries expire an hour after their last
+# update and are dropped once downloaded, so finished jobs and their CSVs don't accumulate.
+# Running jobs re-store their entry as they progress to keep it alive.
+progress_dict = _TTLCache(maxsize=256, ttl=60 * 60)
+
+# Number of CSV rows parsed at a time during bulk processing
+BULK_CSV_CHUNKSIZE = 1000
+
+# Bytes per block handed to pyarrow's CSV reader; each block is parsed in parallel and then
+# split into BULK_CSV_CHUNKSIZE-row chunks
+BULK_CSV_BLOCK_BYTES = 1 << 20
+
+# Column header of the bulk results CSV, in the order produced by _row_output
+RESULT_COLUMNS = [
+    "upc_cd", "vendor_nm", "manufacturer_item_num", "taxonomy_cd", "product_nm", 
+    "product_description_txt", "product_features_txt", "product_weight", "product_dimensions"
+]
+
+# Rows searched on Tavily concurrently during bulk processing. Each search is network-bound,
+# so this can sit well above the CPU count.
+BULK_MAX_WORKERS = 32
+
+# Claude batches in flight at once during bulk processing (one batch per CSV chunk)
+BULK_CLAUDE_WORKERS = 2
+
+# Tavily row searches allowed per minute. Each row issues 3-5 queries and the key is
+# limited to 1000 requests per minute.
+TAVILY_ROWS_PER_MINUTE = 180
+
+class _RateLimiter:
+    """
+    Thread-safe token bucket allowing `rate` acquisitions per `per` seconds.
+    acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, per):
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.fill_rate
+            time.sleep(wait)
+
+_tavily_rate_limiter = _RateLimiter(TAVILY_ROWS_PER_MINUTE, 60)
+
+# Successful searches are cached so repeat lookups of a product skip Tavily and Claude entirely
+SEARCH_CACHE_TTL_SECONDS = 24 * 60 * 60
+_search_cache = _TTLCache(maxsize=10_000, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+# Successful searches are also written to disk so a restart or redeploy doesn't pay for them again
+SEARCH_DISK_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", ".cache", "app")
+_disk_cache = None
+if llm_cache is not None:
+    try:
+        _disk_cache = llm_cache.LLMCache(SEARCH_DISK_CACHE_DIR)
+    except Exception as e:
+        logger.warning("Search results won't be cached on disk: %s", e)
 
-# Global dictionary to track progress for each upload (per user session)
-progress_dict = {}
+def _get_cached_search(cache_key, is_valid=None):
+    """
+    Looks a search up in memory, then on disk (promoting disk hits to memory). Returns None on a miss.
+    is_valid, if given, checks the cached result; results it rejects are dropped from both
+    caches and reported as a miss, so a bad entry is searched again instead of breaking the caller.
+    """
+    cached = _search_cache.get(cache_key)
+    if cached is None and _disk_cache is not None:
+        try:
+            cached = _disk_cache.get(cache_key)
+        except Exception as e:
+            logger.warning("Error reading the search disk cache: %s", e)
+        if isinstance(cached, list):
+            # Stored as JSON, so the result tuple comes back as a list
+            cached = tuple(cached)
+            _search_cache[cache_key] = cached
+    if cached is not None and (not isinstance(cached, tuple) or (is_valid is not None and not is_valid(cached))):
+        logger.warning("Dropping malformed cached search result %s", cache_key)
+        _search_cache.pop(cache_key)
+        if _disk_cache is not None:
+            try:
+                _disk_cache.delete(cache_key)
+            except Exception as e:
+                logger.warning("Error writing the search disk cache: %s", e)
+        return None
+    return cached
+
+def _store_search(cache_key, result):
+    """Caches a successful search in memory and on disk."""
+    _search_cache[cache_key] = result
+    if _disk_cache is not None:
+        try:
+            _disk_cache.set(cache_key, result)
+        except Exception as e:
+            logger.warning("Error writing the search disk cache: %s", e)
+
+# Shared API clients, built on first use and reused by every callback and bulk worker thread
+_api_clients = None
+_api_clients_lock = threading.Lock()
+
+def _get_api_clients():
+    """
+    Returns the shared (tavily_client, claude_client) pair, constructing it once.
+    Construction errors are raised to the caller so they can be reported per request.
+    """
+    global _api_clients
+    if _api_clients is None:
+        with _api_clients_lock:
+            if _api_clients is None:
+                _api_clients = (tavily_extract.upcExtract(), claude.ClaudeQuery())
+    return _api_clients
 
 dcc_upload = dcc.Upload(
     id='upload-data',
@@ -219,7 +419,8 @@ bulk_tab_layout = dbc.Container([
     dbc.Row([
         dbc.Col([
             dbc.Progress(id='progress-bar', value=0, max=100, animated=True, striped=True, style={'height': '30px', 'marginBottom': '15px'}),
-            dcc.Interval(id='progress-interval', interval=800, n_intervals=0),  # poll every 0.8s
+            # Poll every 0.8s, but only while a bulk job is running; idle sessions never wake the server
+            dcc.Interval(id='progress-interval', interval=800, n_intervals=0, disabled=True),
             dcc.Store(id='progress-key', data=None),
             html.Div(id='upload-status', className='mt-2'),
             dbc.Button('Process CSV', id='process-csv-btn', n_clicks=0, style={'backgroundColor': '#d40029', 'borderColor': '#d40029'}, className="ms-1 shadow-sm"),
@@ -243,6 +444,30 @@ def render_content(tab):
     elif tab == 'tab-bulk':
         return bulk_tab_layout
 
+# Markdown layout for a single item result, filled with str.format_map
+_OUTPUT_TEMPLATE = """
+# {Product_Title}
+
+**Product Taxonomy**
+Level 1: {level_1_category}
+Level 2: {level_2_category}
+Level 3: {level_3_category}
+
+**Product Atrributes**
+{attribute_list}
+
+{Product_Description}
+
+**Features:**
+{features_list}
+
+**Product Weight:** {Wholesale_Case_Weight}
+**Product Size:** {Wholesale_Case_Dimensions}
+**UPC:** {UPC}  
+**Manufacturer:** {Vendor}   
+**Manufacturer Code:** {Item_Number} 
+"""
+
 # Callback to handle content generation using Tavily and Claude
 @callback(
     Output('output-paragraph', 'children'), # Target the Markdown component's children
@@ -256,39 +481,24 @@ def single_item_search(submit_clicks, vendor, item_num, upc, bulk=False):
     search_results = tavily_claude_search(vendor, item_num, upc)
     results_dict = search_results[0]
     taxonomy_results = search_results[2]
-    markdown_list = []
-    for key, value in taxonomy_results["attributes"].items():
-        markdown_list.append(f"- **{key}**: {value}")
-        formated_attribute_list = "\n".join(markdown_list)
-    formated_features_list = [f"* {s}\n" for s in results_dict["Product_Features"]]
     results_images = search_results[1]
-    output_string = f"""
-# {results_dict["Product_Title"]}
-
-**Product Taxonomy**
-Level 1: {taxonomy_results["level_1_category"]}
-Level 2: {taxonomy_results["level_2_category"]}
-Level 3: {taxonomy_results["level_3_category"]}
-
-**Product Atrributes**
-{formated_attribute_list}
-
-{results_dict["Product_Description"]}
-
-**Features:**
-{"".join(formated_features_list)}
-
-**Product Weight:** {results_dict["Wholesale_Case_Weight"]}
-**Product Size:** {results_dict["Wholesale_Case_Dimensions"]}
-**UPC:** {results_dict["UPC"]}  
-**Manufacturer:** {results_dict["Vendor"]}   
-**Manufacturer Code:** {results_dict["Item_Number"]} 
-"""
+    # Build each list in one pass and join once
+    formated_attribute_list = "\n".join(f"- **{key}**: {value}" for key, value in taxonomy_results["attributes"].items())
+    formated_features_list = "".join(f"* {s}\n" for s in results_dict["Product_Features"])
+    # ChainMap layers the computed fields over results_dict without copying it
+    output_string = _OUTPUT_TEMPLATE.format_map(ChainMap({
+        "level_1_category": taxonomy_results["level_1_category"],
+        "level_2_category": taxonomy_results["level_2_category"],
+        "level_3_category": taxonomy_results["level_3_category"],
+        "attribute_list": formated_attribute_list,
+        "features_list": formated_features_list,
+    }, results_dict))
     return output_string, results_images
 
 # Callback to handle csv processing
 @callback(
     Output('progress-key', 'data'),
+    Output('progress-interval', 'disabled'),
     Input('process-csv-btn', 'n_clicks'),
     State('upload-data', 'contents'),
     State('upload-data', 'filename'),
@@ -297,87 +507,201 @@ Level 3: {taxonomy_results["level_3_category"]}
     prevent_initial_call=True
 )
 def start_bulk_processing(n_clicks, contents_button, filename_button, contents_dropzone, filename_dropzone):
-    if contents_button is None and contents_dropzone is None:
+    # The dropzone takes precedence when both uploads hold a file
+    contents = contents_dropzone or contents_button
+    if contents is None:
         raise dash.exceptions.PreventUpdate
-    if contents_dropzone is None:
-        content_type, content_string = contents_button.split(',')
-        decoded = base64.b64decode(content_string)
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), dtype=str)
-        df = df.replace({np.nan: None})
-    else:
-        content_type, content_string = contents_dropzone.split(',')
-        decoded = base64.b64decode(content_string)
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), dtype=str)
-        df = df.replace({np.nan: None})
-    
-    args = [(row[1], row[2], row[0]) for _, row in df.iterrows()]
-    total = len(args)
-    
-    # Create a unique key for this upload
+    # Start polling for this job
+    return _start_bulk_job(_decode_upload(contents)), False
+
+def _decode_upload(contents):
+    """Decodes a dcc.Upload 'data:<type>;base64,<payload>' string into a readable file object."""
+    _, content_string = contents.split(',', 1)
+    return io.BytesIO(base64.b64decode(content_string))
+
+def _iter_csv_row_chunks(source):
+    """
+    Streams a bulk upload CSV (header row, then columns upc, vendor, item_num) as lists of
+    (vendor, item_num, upc) tuples, at most BULK_CSV_CHUNKSIZE rows per list.
+    Uses pyarrow's multi-threaded CSV reader when installed, otherwise pandas' C engine.
+    """
+    if pacsv is not None:
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(skip_rows=1, autogenerate_column_names=True,
+                                           block_size=BULK_CSV_BLOCK_BYTES),
+            convert_options=pacsv.ConvertOptions(include_columns=['f0', 'f1', 'f2'],
+                                                 column_types={'f0': pa.string(), 'f1': pa.string(), 'f2': pa.string()})
+        )
+        for batch in reader:
+            for offset in range(0, batch.num_rows, BULK_CSV_CHUNKSIZE):
+                chunk = batch.slice(offset, BULK_CSV_CHUNKSIZE)
+                # String columns keep empty cells as '' (strings_can_be_null defaults to False)
+                upc, vendor, item_num = (chunk.column(i).to_pylist() for i in range(3))
+                yield list(zip(vendor, item_num, upc))
+        return
+
+    reader = pd.read_csv(source, dtype=str, usecols=[0, 1, 2], na_filter=False,
+                         engine='c', chunksize=BULK_CSV_CHUNKSIZE)
+    for chunk in reader:
+        # Columns are positional: upc, vendor, item_num. Empty cells arrive as '' (na_filter=False)
+        yield list(zip(chunk.iloc[:, 1], chunk.iloc[:, 2], chunk.iloc[:, 0]))
+
+def _start_bulk_job(source, cleanup_path=None):
+    """
+    Starts bulk processing of a CSV in a background thread and returns its progress key.
+
+    Args:
+        source: Path or file-like object holding the CSV (columns upc, vendor, item_num)
+        cleanup_path: Optional file removed once the job has finished reading it
+    """
+    # Create a unique key for this upload; 'total' grows as CSV chunks are parsed
     progress_key = str(uuid.uuid4())
-    progress_dict[progress_key] = {
-        'current': 0, 'total': total, 'results': [None]*total, 'finished': False, 'csv': None
+    prog = {
+        'current': 0, 'total': 0, 'results': [], 'finished': False, 'csv': None
     }
+    progress_dict[progress_key] = prog
     
-    def worker(idx, arg):
-        result = process_single_row(*arg)
-        progress_dict[progress_key]['results'][idx] = result
-        progress_dict[progress_key]['current'] += 1
-        return result
+    # Guards the completed-row counter and the CSV writer; `+=` is not atomic across threads
+    progress_lock = threading.Lock()
+
+    # Rows are tuples in column order, so they are written straight out without a DataFrame.
+    # Each row is written (and its slot released) as soon as every row before it has
+    # finished, so results aren't held as tuples and as CSV text at the same time.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(RESULT_COLUMNS)
+    written = 0
+
+    def write_finished_rows():
+        # Caller holds progress_lock
+        nonlocal written
+        results = prog['results']
+        while written < len(results) and results[written] is not None:
+            writer.writerow(results[written])
+            results[written] = None
+            written += 1
     
+    def claude_worker(batch_queue):
+        while True:
+            item = batch_queue.get()
+            if item is None:
+                return
+            start, rows, outputs, batch_rows, contexts = item
+            try:
+                outputs = _bulk_claude_stage(rows, outputs, batch_rows, contexts)
+            except Exception as exc:
+                logger.error('Rows %d-%d generated an exception: %s', start, start + len(rows) - 1, exc)
+                # Rows already filled from the cache keep their results
+                outputs = [output if output is not None else _row_output(*row, None)
+                           for output, row in zip(outputs, rows)]
+            prog['results'][start:start + len(rows)] = outputs
+            with progress_lock:
+                prog['current'] += len(rows)
+                write_finished_rows()
+            # Refresh the entry's expiry while the job is still running
+            progress_dict[progress_key] = prog
+
     def thread_target():
         try:
-            # Use ThreadPoolExecutor to limit concurrent threads
-            max_workers = 5  # Adjust this number based on your needs
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all tasks
-                future_to_idx = {executor.submit(worker, idx, arg): idx for idx, arg in enumerate(args)}
-                
-                # Wait for completion
-                for future in concurrent.futures.as_completed(future_to_idx):
-                    idx = future_to_idx[future]
-                    try:
-                        result = future.result()
-                    except Exception as exc:
-                        print(f'Row {idx} generated an exception: {exc}')
+            # Tavily and Claude run as two overlapping stages: while Claude works through one
+            # chunk's batch, Tavily is already searching the next chunk
+            batch_queue = queue.Queue(maxsize=BULK_CLAUDE_WORKERS)
+            claude_threads = [threading.Thread(target=claude_worker, args=(batch_queue,), daemon=True)
+                              for _ in range(BULK_CLAUDE_WORKERS)]
+            for t in claude_threads:
+                t.start()
+            try:
+                # Use ThreadPoolExecutor to limit concurrent Tavily searches
+                with concurrent.futures.ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS) as executor:
+                    # Parse the upload chunk by chunk so only one chunk is held at a time
+                    for rows in _iter_csv_row_chunks(source):
+                        start = len(prog['results'])
+                        prog['results'].extend([None] * len(rows))
+                        prog['total'] += len(rows)
+                        batch_queue.put((start, rows) + _bulk_tavily_stage(rows, executor))
+            finally:
+                for _ in claude_threads:
+                    batch_queue.put(None)
+                for t in claude_threads:
+                    t.join()
             
-            # All rows done: prepare CSV for download
-            results = progress_dict[progress_key]['results']
-            print(results)
-            results_df = pd.DataFrame(results, columns=[
-                "upc_cd", "vendor_nm", "manufacturer_item_num", "taxonomy_cd", "product_nm", 
-                "product_description_txt", "product_features_txt", "product_weight", "product_dimensions"
-            ])
-            csv = results_df.to_csv(index=False)
-            progress_dict[progress_key]['csv'] = csv
-            progress_dict[progress_key]['finished'] = True
-            results_df['timestamp'] = pd.Timestamp.now()
+            # All rows done: the CSV for download is already written
+            with progress_lock:
+                write_finished_rows()
+            logger.debug("results: %d rows written", written)
+            prog['csv'] = buffer.getvalue()
+            prog['finished'] = True
+            # results_df = pd.DataFrame(results, columns=RESULT_COLUMNS)
+            # results_df['timestamp'] = pd.Timestamp.now()
             # response_to_delta_table.write_dataframe_to_delta_table("ai_squad_np.pcg.generated_product_information", results_df)
             
         except Exception as e:
-            print(f"Error in thread_target: {e}")
-            progress_dict[progress_key]['finished'] = True
+            logger.error("Error in thread_target: %s", e)
+            prog['finished'] = True
+        finally:
+            # Restart the expiry clock so the result is kept for a full TTL after finishing
+            progress_dict[progress_key] = prog
+            if cleanup_path is not None:
+                try:
+                    os.remove(cleanup_path)
+                except OSError:
+                    pass
     
     threading.Thread(target=thread_target, daemon=True).start()
     return progress_key
 
+# --- Direct upload endpoints ---
+# dcc.Upload ships files as base64 data URLs; these routes accept a plain multipart upload
+# instead, spool it to disk and let pandas read the file directly.
+@app.server.route('/upload', methods=['POST'])
+def upload_csv():
+    """Starts bulk processing of the CSV in the 'file' form field and returns its progress key."""
+    upload = flask.request.files.get('file')
+    if upload is None:
+        return flask.jsonify({'error': "Missing 'file' form field"}), 400
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    upload.save(path)
+    return flask.jsonify({'progress_key': _start_bulk_job(path, cleanup_path=path)})
+
+@app.server.route('/upload/<progress_key>', methods=['GET'])
+def upload_result(progress_key):
+    """Returns job progress as JSON, or the results CSV once the job has finished."""
+    prog = progress_dict.get(progress_key)
+    if prog is None:
+        return flask.jsonify({'error': 'Unknown progress key'}), 404
+    if prog['finished'] and prog['csv']:
+        # Results are only served once; drop them so the CSV isn't kept in memory
+        progress_dict.pop(progress_key)
+        return flask.Response(prog['csv'], mimetype='text/csv',
+                              headers={'Content-Disposition': 'attachment; filename=results.csv'})
+    return flask.jsonify({'current': prog['current'], 'total': prog['total'], 'finished': prog['finished']})
+
+
 # --- Callback to poll progress and update progress bar ---
 @callback(
     Output('progress-bar', 'value'),
     Output('progress-bar', 'label'),
     Output('progress-bar', 'color'),
+    Output('progress-interval', 'disabled', allow_duplicate=True),
     Input('progress-interval', 'n_intervals'),
     State('progress-key', 'data'),
+    State('progress-bar', 'value'),
     prevent_initial_call=True
 )
-def update_progress_bar(n_intervals, progress_key):
-    if not progress_key or progress_key not in progress_dict:
+def update_progress_bar(n_intervals, progress_key, shown_percent):
+    prog = progress_dict.get(progress_key) if progress_key else None
+    if prog is None:
         raise dash.exceptions.PreventUpdate
-    prog = progress_dict[progress_key]
     total, current = prog['total'], prog['current']
     percent = int((current / total) * 100) if total else 0
+    if percent == shown_percent and not prog['finished']:
+        # Nothing new to show; skip the round trip to the browser
+        raise dash.exceptions.PreventUpdate
     color = 'success' if prog['finished'] else 'info'
-    return percent, f"{percent}% Complete", color
+    # Stop polling once the job has finished
+    return percent, f"{percent}% Complete", color, prog['finished']
 
 # --- Callback to auto-download when finished ---
 @callback(
@@ -389,13 +713,14 @@ def update_progress_bar(n_intervals, progress_key):
     prevent_initial_call=True
 )
 def auto_download_csv(progress_value, progress_key, downloaded):
-    if not progress_key or progress_key not in progress_dict or downloaded:
+    prog = progress_dict.get(progress_key) if progress_key else None
+    if prog is None or downloaded:
         raise dash.exceptions.PreventUpdate
-    prog = progress_dict[progress_key]
     if not prog['finished'] or not prog['csv']:
         raise dash.exceptions.PreventUpdate
-    # Only trigger download once!
+    # Only trigger download once! The entry is no longer needed after this
     #print(prog['csv'])
+    progress_dict.pop(progress_key)
     return dict(content=prog['csv'], filename='results.csv'), True
 
 # Callback to update screen after CSV upload
@@ -411,8 +736,6 @@ def update_upload_status(contents_button, contents_dropzone, filename_button, fi
 
     ctx = dash.callback_context # Requires 'import dash' or 'from dash import callback_context'
     
-    contents = None
-    filename = None
     message = "Please select a CSV file using either method."
 
     if not ctx.triggered:
@@ -422,19 +745,9 @@ def update_upload_status(contents_button, contents_dropzone, filename_button, fi
     # Get the ID of the component that triggered the callback
     triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
-    if triggered_id == 'upload-data':
-        contents = contents_button
-        filename = filename_button
-    elif triggered_id == 'upload-data-dropzone':
-        contents = contents_dropzone
-        filename = filename_dropzone
-    # Fallback if triggered_id isn't clear or for older Dash versions (less precise)
-    elif contents_button is not None:
-        contents = contents_button
-        filename = filename_button
-    elif contents_dropzone is not None:
-        contents = contents_dropzone
-        filename = filename_dropzone
+    # Use the upload that fired; if triggered_id isn't clear (older Dash versions), prefer the button
+    use_dropzone = triggered_id == 'upload-data-dropzone' or (triggered_id != 'upload-data' and contents_button is None)
+    contents, filename = (contents_dropzone, filename_dropzone) if use_dropzone else (contents_button, filename_button)
 
     if contents is not None:
         # You would typically parse the contents here (e.g., base64 decode, read into pandas)
@@ -458,37 +771,121 @@ def clear_inputs(clear_clicks):
     return "", "", ""
 
 # Miscellaneous functions
-def process_single_row(vendor, item_num, upc):
-    # return None
-    results_dict = tavily_claude_search(vendor, item_num, upc, bulk=True)[0]
+# Keys of a Claude result dict, in bulk CSV column order
+BULK_RESULT_KEYS = ("UPC", "Vendor", "Item_Number", "Product_Category", "Product_Title", "Product_Description",
+                    "Product_Features", "Wholesale_Case_Weight", "Wholesale_Case_Dimensions")
+
+def _is_bulk_result(results_dict):
+    """True if results_dict is a Claude result with every column _row_output needs."""
+    return isinstance(results_dict, dict) and all(key in results_dict for key in BULK_RESULT_KEYS)
+
+def _row_output(vendor, item_num, upc, results_dict):
+    """Maps a Claude result dict (or None when the search failed) to the bulk CSV column order."""
     if results_dict is None:
         return upc, vendor, item_num,  "", "", "", "", "", ""
     else:
-        return results_dict["UPC"], results_dict["Vendor"], results_dict["Item_Number"], results_dict["Product_Category"], results_dict["Product_Title"], results_dict["Product_Description"], results_dict["Product_Features"], results_dict["Wholesale_Case_Weight"], results_dict["Wholesale_Case_Dimensions"]
+        return tuple(results_dict[key] for key in BULK_RESULT_KEYS)
 
-def tavily_claude_search(vendor, item_num, upc, bulk=False):
-    vendor = "" if vendor is None else str(vendor)
-    item_num = "" if item_num is None else str(item_num)
-    upc = "" if upc is None else str(upc)
+def _bulk_tavily_stage(rows, executor):
     """
-    Uses Tavily to search for product info based on inputs (UPC or Vendor/Item#),
-    then uses Claude to generate a description based on Tavily's findings.
-    Finally, uses the start of the Claude description to search for images via Tavily
-    and displays the description followed by the images.
+    First bulk stage for a chunk of (vendor, item_num, upc) rows.
+    Rows already in the search cache are resolved immediately; the rest are searched on
+    Tavily concurrently via `executor`, throttled by _tavily_rate_limiter. Rows sharing a
+    cache key (duplicate products in the upload) are searched only once.
+    Returns (outputs, batch_rows, contexts): outputs aligned with `rows` (None where still
+    pending), and the row indices with the Tavily context to send to Claude for each.
     """
-    # Check if imports worked
     if tavily_extract is None or claude is None:
-        print("Error: tavily_extract or claude modules not imported successfully.")
-        return None, "Error: Required search/generation modules could not be loaded. Check server logs."
-
-    # Initialize clients within the callback
+        logger.error("tavily_extract or claude modules not imported successfully.")
+        return [_row_output(*row, None) for row in rows], [], []
     try:
-        tavily_client = tavily_extract.upcExtract()
-        claude_client = claude.ClaudeQuery()
+        tavily_client, _ = _get_api_clients()
     except Exception as e:
-        print(f"Error initializing API clients: {e}")
-        return None, f"Error initializing API clients: {e}. Check API keys and dependencies."
+        logger.error("Error initializing API clients: %s", e)
+        return [_row_output(*row, None) for row in rows], [], []
+
+    outputs = [None] * len(rows)
+    pending = {}  # Cache key -> indices of the rows waiting on that search
+    for i, (vendor, item_num, upc) in enumerate(rows):
+        cache_key = _search_cache_key(vendor, item_num, upc, True)
+        cached = _get_cached_search(cache_key, lambda result: len(result) == 2 and _is_bulk_result(result[0]))
+        if cached is not None:
+            outputs[i] = _row_output(vendor, item_num, upc, cached[0])
+        else:
+            pending.setdefault(cache_key, []).append(i)
+
+    def search(group):
+        _tavily_rate_limiter.acquire()
+        return _tavily_text_search(tavily_client, *rows[group[0]])[0]
+
+    groups = list(pending.values())
+    batch_rows, contexts = [], []
+    for group, context in zip(groups, executor.map(search, groups)):
+        for i in group:
+            if context:
+                batch_rows.append(i)
+                contexts.append(context)
+            else:
+                outputs[i] = _row_output(*rows[i], None)
+    return outputs, batch_rows, contexts
+
+def _bulk_claude_stage(rows, outputs, batch_rows, contexts):
+    """
+    Second bulk stage: sends every row that found Tavily context to Claude and fills in
+    `outputs`, as one Message Batches request for large chunks and as concurrent requests
+    for small ones (see ClaudeQuery.generate_multiple_products). Successful results are cached.
+    Rows with the same context share one request.
+    """
+    if batch_rows:
+        _, claude_client = _get_api_clients()
+        unique_contexts = list(dict.fromkeys(contexts))
+        parsed_by_context = dict(zip(unique_contexts, claude_client.generate_multiple_products(unique_contexts)))
+        for i, context in zip(batch_rows, contexts):
+            parsed = parsed_by_context[context]
+            results_dict = parsed[0] if parsed else None
+            # Error and unparseable responses come back as {"error": ...} / {"response": ...};
+            # those, and replies missing a column, are neither written nor cached
+            if not _is_bulk_result(results_dict):
+                if results_dict and "error" not in results_dict and "response" not in results_dict:
+                    logger.warning("Claude's reply for %s is missing result columns; leaving it blank", rows[i])
+                outputs[i] = _row_output(*rows[i], None)
+                continue
+            try:
+                outputs[i] = _row_output(*rows[i], results_dict)
+                _store_search(_search_cache_key(*rows[i], True), (results_dict, None))
+            except Exception as e:
+                # One bad row must not blank the rest of the chunk
+                logger.error("Row %s generated an exception: %s", rows[i], e)
+                outputs[i] = _row_output(*rows[i], None)
 
+    return [output if output is not None else _row_output(*row, None) for output, row in zip(outputs, rows)]
+
+def _search_cache_key(vendor, item_num, upc, bulk):
+    """Builds a deterministic cache key from the normalized search inputs."""
+    vendor = "" if vendor is None else str(vendor).strip().lower()
+    item_num = "" if item_num is None else str(item_num).strip()
+    upc = "" if upc is None else str(upc).strip()
+    return hashlib.sha1(f"{upc}|{vendor}|{item_num}|{int(bulk)}".encode('utf-8')).hexdigest()
+
+def tavily_claude_search(vendor, item_num, upc, bulk=False):
+    """
+    Cached wrapper around _tavily_claude_search. Successful results are kept in memory for
+    SEARCH_CACHE_TTL_SECONDS and on disk; errors are never cached so they can be retried.
+    """
+    cache_key = _search_cache_key(vendor, item_num, upc, bulk)
+    cached = _get_cached_search(cache_key)
+    if cached is not None:
+        return cached
+    result = _tavily_claude_search(vendor, item_num, upc, bulk)
+    if result is not None and result[0] is not None:
+        _store_search(cache_key, result)
+    return result
+
+def _tavily_text_search(tavily_client, vendor, item_num, upc):
+    """
+    Runs the Tavily text search for one product (UPC first, otherwise Vendor + Item #).
+    Returns (tavily_output, error_message); exactly one of the two is None.
+    """
     # --- Input Validation ---
     vendor = vendor.strip() if vendor else None
     item_num = item_num.strip() if item_num else None
@@ -499,102 +896,278 @@ def tavily_claude_search(vendor, item_num, upc, bulk=False):
 
     # --- Tavily Text Search ---
     tavily_output = ""
-    print("Starting Tavily text search...")
+    logger.debug("Starting Tavily text search...")
     try:
         if upc:
-            print(f"  Searching Tavily with UPC: '{upc}'")
+            logger.debug("  Searching Tavily with UPC: '%s'", upc)
             tavily_output = tavily_client.run(upc=upc)
         elif all([vendor, item_num]):
-            print(f"  Searching Tavily with: Item='{item_num}', Manuf='{vendor}'")
+            logger.debug("  Searching Tavily with: Item='%s', Manuf='%s'", item_num, vendor)
             tavily_output = tavily_client.run(item_num=item_num, manufacturer_name=vendor)
         else:
-             print("  Insufficient data provided. Need UPC or both Vendor and Item #.")
+             logger.debug("  Insufficient data provided. Need UPC or both Vendor and Item #.")
              return None, "Please provide a UPC, OR provide both Vendor and Manufacturer Item Number."
-        print("Tavily text search complete.")
+        logger.debug("Tavily text search complete.")
     except Exception as e:
-        print(f"Error during Tavily text search: {e}")
+        logger.error("Error during Tavily text search: %s", e)
         return None, f"An error occurred during the web search. Please check the console for details. Error: {e}"
 
-    # --- Process Tavily Results & Query Claude ---
-    if not tavily_output or tavily_output.strip() == '':
-        print("  Tavily returned no results.")
+    if not tavily_output or tavily_output.isspace():
+        logger.debug("  Tavily returned no results.")
         return None, "No relevant information found via web search for the provided details."
-    else:
-        print("  Tavily search successful. Querying Claude...")
-        try:
-            # Pass Tavily results to Claude 
-            claude_content_blocks, taxonomy = claude_client.search(context=tavily_output)
-            # Extract text content from the list of blocks returned by claude.py
-            claude_text = claude_content_blocks[0]
-            if isinstance(claude_content_blocks, list):
-                 for block in claude_content_blocks:
-                     if type(block) is Exception:
-                         print(block)
-                         return None
-                     if hasattr(block, 'text'):
-                         claude_text += block.text + "\n"
-            else:
-                print(f"Warning: Unexpected response format from Claude: {type(claude_content_blocks)}")
-            print("  Claude query complete.")
-
-            if not claude_text:
-                print("  Claude returned no description (or text extraction failed).")
-                return None, "Web search found information, but could not generate a refined description."
-            elif not bulk:
-                # --- Get succint item name for tavily image search ---
-                product_search_term = f'{claude_text["Product_Title"]}; {claude_text["Vendor"]}, {claude_text["Item_Number"]}'
-                # --- Tavily Image Search (using Claude's output) ---
-                image_html = "" # Initialize empty string for image HTML
-                print("  Starting Tavily image search based on Claude description...")
-                try:
-                    image_query = product_search_term
-                    print(f"    Image search query for: '{image_query}'")
-
-                    # Call Tavily run method requesting images
-                    image_urls = tavily_client.run(queries=image_query, include_images=True)
-                    print(image_urls)
-                    for url in image_urls:
-                        print(get_image_resolution_from_url(url))
-                    if image_urls and isinstance(image_urls, list):
-                        print(f"    Found {len(image_urls)} images.")
-                        # Generate HTML for the image container and images
-                        image_html = "<hr/><p><strong>Images:</strong></p>"
-                        # Add a container div with flex properties for horizontal layout
-                        image_html += "<div style='display: flex; flex-direction: row; flex-wrap: wrap; justify-content: flex-start; align-items: center;'>" # Flex container
-                        image_html += ''.join(
-                            f'<img src="{url}" alt="Product Image" '
-                            # Individual image styling (display:inline-block removed as flex handles it)
-                            f'style="max-width:150px; height:auto; margin: 5px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.1);" '
-                            f'onerror="this.style.display=\'none\'"/>'
-                            for url in image_urls
-                        )
-                        image_html += "</div>" # Close flex container
-                    else:
-                        print("    No images found or invalid response from Tavily image search.")
-
-                except Exception as img_e:
-                    print(f"    Error during Tavily image search: {img_e}")
-                    # Don't fail the whole request, just skip images
-                    image_html = "\n\n(Error retrieving images)"
-
-
-                # Combine Claude's text and the image HTML
-                # Use Markdown line breaks (\n\n) before appending HTML if needed. Commented out the images since they are not needed at the moment
-                # final_output = f"{claude_text}\n\n{image_html}"
-                final_output = claude_content_blocks[0], image_html, taxonomy
-                processed_data = [(upc,vendor,item_num,claude_text,image_html)]  
-                
-                # response_to_delta_table.write_to_delta_table("ai_squad_np.pcg.product_content_response_history", processed_data)
-                return final_output
-            else:
-                return claude_text, None
-        except Exception as e:
-            print(f"Error during Claude query or processing: {e}")
-            return None, f"An error occurred while generating the description. Please check the console for details. Error: {e}"
+    if len(tavily_output) < tavily_extract.MIN_CONTEXT_CHARS:
+        logger.debug("  Tavily returned only %d characters; skipping Claude.", len(tavily_output))
+        return None, "Insufficient signal from web search."
+    return tavily_output, None
+
+def _tavily_claude_search(vendor, item_num, upc, bulk=False):
+    vendor = "" if vendor is None else str(vendor)
+    item_num = "" if item_num is None else str(item_num)
+    upc = "" if upc is None else str(upc)
+    """
+    Uses Tavily to search for product info based on inputs (UPC or Vendor/Item#),
+    then uses Claude to generate a description based on Tavily's findings.
+    Finally, uses the start of the Claude description to search for images via Tavily
+    and displays the description followed by the images.
+    """
+    # Check if imports worked
+    if tavily_extract is None or claude is None:
+        logger.error("tavily_extract or claude modules not imported successfully.")
+        return None, "Error: Required search/generation modules could not be loaded. Check server logs."
+
+    # Reuse the shared API clients instead of building new ones per call
+    try:
+        tavily_client, claude_client = _get_api_clients()
+    except Exception as e:
+        logger.error("Error initializing API clients: %s", e)
+        return None, f"Error initializing API clients: {e}. Check API keys and dependencies."
+
+    tavily_output, error_message = _tavily_text_search(tavily_client, vendor, item_num, upc)
+    if error_message is not None:
+        return None, error_message
+
+    # --- Process Tavily Results & Query Claude ---
+    logger.debug("  Tavily search successful. Querying Claude...")
+    try:
+        # Pass Tavily results to Claude 
+        claude_content_blocks, taxonomy = claude_client.search(context=tavily_output)
+        # Extract text content from the list of blocks returned by claude.py
+        claude_text = claude_content_blocks[0]
+        if isinstance(claude_content_blocks, list):
+             for block in claude_content_blocks:
+                 if type(block) is Exception:
+                     logger.error("%s", block)
+                     return None
+                 if hasattr(block, 'text'):
+                     claude_text += block.text + "\n"
+        else:
+            logger.warning("Unexpected response format from Claude: %s", type(claude_content_blocks))
+        logger.debug("  Claude query complete.")
+
+        if not claude_text:
+            logger.debug("  Claude returned no description (or text extraction failed).")
+            return None, "Web search found information, but could not generate a refined description."
+        elif not bulk:
+            # --- Get succint item name for tavily image search ---
+            product_search_term = f'{claude_text["Product_Title"]}; {claude_text["Vendor"]}, {claude_text["Item_Number"]}'
+            # --- Tavily Image Search (using Claude's output) ---
+            image_html = "" # Initialize empty string for image HTML
+            logger.debug("  Starting Tavily image search based on Claude description...")
+            try:
+                image_query = product_search_term
+                logger.debug("    Image search query for: '%s'", image_query)
+
+                # Call Tavily run method requesting images
+                image_urls = tavily_client.run(queries=image_query, include_images=True)
+                if isinstance(image_urls, list):
+                    # Tavily often repeats the same CDN URL across queries; keep the first occurrence
+                    image_urls = list(dict.fromkeys(image_urls))
+                logger.debug("%s", image_urls)
+                if DEBUG_IMAGE_RESOLUTION:
+                    # Probe image resolutions concurrently over the shared session (diagnostics only)
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=IMAGE_PROBE_WORKERS) as pool:
+                        for resolution in pool.map(_cached_image_resolution, image_urls):
+                            logger.debug("%s", resolution)
+                if image_urls and isinstance(image_urls, list):
+                    logger.debug("    Found %d images.", len(image_urls))
+                    # Generate HTML for the image container and images
+                    image_html = "<hr/><p><strong>Images:</strong></p>"
+                    # Add a container div with flex properties for horizontal layout
+                    image_html += "<div style='display: flex; flex-direction: row; flex-wrap: wrap; justify-content: flex-start; align-items: center;'>" # Flex container
+                    image_html += ''.join(
+                        f'<img src="{url}" alt="Product Image" '
+                        # Individual image styling (display:inline-block removed as flex handles it)
+                        f'style="max-width:150px; height:auto; margin: 5px; border-radius: 8px; box-shadow: 2px 2px 5px rgba(0,0,0,0.1);" '
+                        f'onerror="this.style.display=\'none\'"/>'
+                        for url in image_urls
+                    )
+                    image_html += "</div>" # Close flex container
+                else:
+                    logger.debug("    No images found or invalid response from Tavily image search.")
+
+            except Exception as img_e:
+                logger.error("    Error during Tavily image search: %s", img_e)
+                # Don't fail the whole request, just skip images
+                image_html = "\n\n(Error retrieving images)"
+
+
+            # Combine Claude's text and the image HTML
+            # Use Markdown line breaks (\n\n) before appending HTML if needed. Commented out the images since they are not needed at the moment
+            # final_output = f"{claude_text}\n\n{image_html}"
+            final_output = claude_content_blocks[0], image_html, taxonomy
+            processed_data = [(upc,vendor,item_num,claude_text,image_html)]  
+            
+            # response_to_delta_table.write_to_delta_table("ai_squad_np.pcg.product_content_response_history", processed_data)
+            return final_output
+        else:
+            return claude_text, None
+    except Exception as e:
+        logger.error("Error during Claude query or processing: %s", e)
+        return None, f"An error occurred while generating the description. Please check the console for details. Error: {e}"
+
+# Shared HTTP session for image probes so connections (and TLS handshakes) are reused across URLs
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2))
+_http_session.mount('https://', _http_adapter)
+_http_session.mount('http://', _http_adapter)
+
+# Image resolutions are only logged for diagnostics; probing is skipped unless DEBUG_IMAGE_RES=1
+DEBUG_IMAGE_RESOLUTION = os.environ.get("DEBUG_IMAGE_RES") == "1"
+
+# Image URLs probed concurrently for their resolution
+IMAGE_PROBE_WORKERS = 16
+
+# Most bytes requested when probing an image for its resolution. Image headers (JPEG SOF,
+# PNG IHDR, GIF/WebP headers) sit well inside this window.
+IMAGE_HEADER_RANGE_BYTES = 64 * 1024
+
+# The probe reads the image in chunks of this size and stops once the size is known
+IMAGE_PROBE_CHUNK_BYTES = 4096
+
+def _read_image(image_url):
+    """
+    Downloads a whole image and returns (content_type, data); data is None when the
+    response is not an image.
+    """
+    with _http_session.get(image_url, timeout=10) as response:
+        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        content_type = response.headers.get('content-type')
+        if not content_type or not content_type.lower().startswith('image/'):
+            return content_type, None
+        return content_type, response.content
+
+def _probe_image_size(image_url, limit):
+    """
+    Streams the first `limit` bytes of an image in IMAGE_PROBE_CHUNK_BYTES chunks, feeding
+    them to Pillow's incremental parser, and stops reading as soon as the size is known.
+    Returns (content_type, size, complete): size is (width, height) or None when it was not
+    found, and `complete` is False when the body was cut short at `limit` bytes.
+    """
+    headers = {'Range': f'bytes=0-{limit - 1}'}
+    with _http_session.get(image_url, headers=headers, stream=True, timeout=10) as response:
+        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        content_type = response.headers.get('content-type')
+        if not content_type or not content_type.lower().startswith('image/'):
+            return content_type, None, True
+        parser = ImageFile.Parser()
+        head = b''
+        for chunk in response.iter_content(IMAGE_PROBE_CHUNK_BYTES):
+            head += chunk
+            # JPEG, PNG, GIF and WebP sizes are read straight from their header bytes;
+            # Pillow's parser only handles other formats
+            size = _header_size(head)
+            if size is not None:
+                return content_type, size, True
+            try:
+                parser.feed(chunk)
+            except (OSError, SyntaxError):
+                break
+            if parser.image is not None:
+                return content_type, parser.image.size, True
+            if len(head) >= limit:
+                break
+        # A 206 covers only the requested range; a 200 that filled the window may have more data left
+        complete = response.status_code != 206 and len(head) < limit
+        return content_type, None, complete
+
+# JPEG start-of-frame markers (SOF0-SOF15, excluding DHT/JPG/DAC) carry the frame dimensions
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def _jpeg_size(data):
+    """
+    Reads (width, height) from a JPEG's SOF segment by walking the marker segments,
+    without decoding any pixel data. Returns None if no SOF marker is found in `data`.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos, end = 2, len(data)
+    while pos + 4 <= end:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7:  # Standalone markers carry no length
+            pos += 2
+            continue
+        seg_len = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > end:
+                return None
+            height = int.from_bytes(data[pos + 5:pos + 7], 'big')
+            width = int.from_bytes(data[pos + 7:pos + 9], 'big')
+            return (width, height)
+        pos += 2 + seg_len
+    return None
+
+def _header_size(data):
+    """
+    Reads (width, height) from the start of a JPEG, PNG, GIF or WebP file with plain byte
+    unpacking. Returns None for other formats or when `data` is too short to hold the size.
+    """
+    if data[:2] == b'\xff\xd8':
+        return _jpeg_size(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        # IHDR is always the first chunk
+        if len(data) >= 24 and data[12:16] == b'IHDR':
+            return (int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big'))
+        return None
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) >= 10:
+            return (int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little'))
+        return None
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == b'\x9d\x01\x2a':
+            # Lossy: 14-bit sizes after the key frame start code
+            return (int.from_bytes(data[26:28], 'little') & 0x3FFF, int.from_bytes(data[28:30], 'little') & 0x3FFF)
+        if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+            # Lossless: two 14-bit (size - 1) fields after the signature byte
+            bits = int.from_bytes(data[21:25], 'little')
+            return ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        if chunk == b'VP8X' and len(data) >= 30:
+            # Extended: 24-bit (size - 1) canvas fields
+            return (int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1)
+    return None
+
+# Resolutions of previously probed image URLs; failures are not cached so they can be retried
+_image_resolution_cache = _TTLCache(maxsize=4096, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+def _cached_image_resolution(image_url):
+    """Memoized get_image_resolution_from_url; only successful (width, height) results are kept."""
+    resolution = _image_resolution_cache.get(image_url)
+    if resolution is None:
+        resolution = get_image_resolution_from_url(image_url)
+        if isinstance(resolution, tuple):
+            _image_resolution_cache[image_url] = resolution
+    return resolution
 
 def get_image_resolution_from_url(image_url):
     """
-    Downloads an image from a URL and attempts to extract its resolution (width and height).
+    Fetches the start of an image from a URL and attempts to extract its resolution (width and height).
+    The image is streamed only until its header has been parsed (usually the first few KB); the
+    full image is fetched only if the header does not fit in IMAGE_HEADER_RANGE_BYTES.
 
     Args:
         image_url (str): The URL of the image.
@@ -605,22 +1178,25 @@ def get_image_resolution_from_url(image_url):
                Returns None if the content type is not recognized as an image and processing is skipped.
     """
     try:
-        # Send a GET request to the image URL
-        # Use a timeout to prevent hanging indefinitely
-        response = requests.get(image_url, stream=True, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+        # Stream the header bytes only; a timeout prevents hanging indefinitely
+        content_type, size, complete = _probe_image_size(image_url, IMAGE_HEADER_RANGE_BYTES)
 
         # Check if the content type is an image
-        content_type = response.headers.get('content-type')
-        if not content_type or not content_type.lower().startswith('image/'):
+        if content_type is None or not content_type.lower().startswith('image/'):
             # If not an image, return an informative message or None
             return f"Content-Type is '{content_type}', not recognized as an image. Cannot get resolution."
+        if size is not None:
+            return size
+        if complete:
+            # Handle cases where Pillow cannot identify the image format
+            return f"Could not identify or open image from URL: {image_url}. The file may be corrupted or not a supported image format."
 
-        # Open the image from the response content
+        # Header did not fit in the probed range (e.g. large EXIF block); fall back to the full image
+        _, data = _read_image(image_url)
         try:
-            img = Image.open(io.BytesIO(response.content))
+            # Open the image lazily; Pillow reads the size from the header without decoding pixels
+            img = Image.open(io.BytesIO(data))
         except UnidentifiedImageError:
-            # Handle cases where Pillow cannot identify the image format
             return f"Could not identify or open image from URL: {image_url}. The file may be corrupted or not a supported image format."
 
         # Get the image resolution (width, height)
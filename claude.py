@@ -1,17 +1,169 @@
 import anthropic
+import asyncio
+import hashlib
+import httpx
 import json
-from typing import Optional, Dict, Any, List
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+try:
+    # orjson is a much faster parser for the model's JSON output; its JSONDecodeError
+    # subclasses json.JSONDecodeError, so the handlers below work with either
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+from typing import Optional, Dict, Any, List, Iterator, Callable
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
+# Longest wait for a Message Batches job before it is canceled and its requests reported failed
+BATCH_TIMEOUT_SECONDS = 2 * 3600
+
+# Characters that change the state of the JSON object scanner
+_JSON_STRUCTURAL_RE = re.compile(r'[{}"\\]')
+
+class _JsonObjectScanner:
+    """
+    Incremental brace-balanced scanner: feed() text as it arrives and get back each
+    top-level {...} span completed by that piece. Nested objects stay inside their parent
+    span, and braces inside JSON strings (including escaped quotes) are ignored.
+    """
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape_pending = False
+
+    def feed(self, text: str) -> List[str]:
+        completed = []
+        skip_pos = 0 if self._escape_pending else -1
+        start = 0
+        # Only jump between structural characters; plain text is skipped by the regex engine
+        for match in _JSON_STRUCTURAL_RE.finditer(text):
+            pos = match.start()
+            if pos == skip_pos:
+                continue
+            char = text[pos]
+            if self._in_string:
+                if char == '\\':
+                    skip_pos = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Quotes in surrounding prose are not JSON strings
+                self._in_string = self._depth > 0
+            elif char == '{':
+                if self._depth == 0:
+                    start = pos
+                self._depth += 1
+            elif char == '}' and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(text[start:pos + 1])
+                    completed.append("".join(self._parts))
+                    self._parts = []
+        # Keep the unfinished object (and a trailing backslash escape) for the next piece
+        if self._depth:
+            self._parts.append(text[start:])
+        self._escape_pending = skip_pos == len(text)
+        return completed
+
+def _iter_json_objects(text: str) -> List[str]:
+    """Return each top-level {...} span in free-form text; an unclosed trailing object is dropped."""
+    return _JsonObjectScanner().feed(text)
+
 class ClaudeQuery:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, response_cache_size: int = 256,
+                 http_client: Optional[httpx.Client] = None):
+        """
+        Args:
+            api_key: Anthropic API key; read from Streamlit secrets when omitted
+            response_cache_size: Number of recent responses kept in the in-memory LRU cache
+            http_client: Optional shared httpx.Client, so several ClaudeQuery instances (or other
+                callers) reuse one connection pool instead of each opening their own
+        """
         if api_key is None:
             api_key = st.secrets["ANTHROPIC_API_KEY"]
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = anthropic.Anthropic(api_key=api_key, http_client=http_client)
+        self._api_key = api_key  # For the AsyncAnthropic client of each concurrent run
+        # LRU of recent response texts keyed by a hash of the full request
+        self.response_cache_size = response_cache_size
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+
+    @staticmethod
+    def _response_cache_key(model: str, temperature: float, system_prompt: str, text: str) -> str:
+        """Content-addressed key for a request: model, temperature, system prompt and user text."""
+        request = "\x1f".join((model, repr(temperature), system_prompt, text))
+        return hashlib.blake2b(request.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        with self._response_cache_lock:
+            response_text = self._response_cache.get(key)
+            if response_text is not None:
+                self._response_cache.move_to_end(key)
+            return response_text
+
+    def _cache_response(self, key: str, response_text: str) -> None:
+        if self.response_cache_size <= 0:
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = response_text
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self.response_cache_size:
+                self._response_cache.popitem(last=False)
+
+    @staticmethod
+    def _message_text(message) -> str:
+        """Concatenate the text blocks of a Messages API response."""
+        content = message.content
+        if len(content) == 1:
+            # The usual case: a single text block
+            return getattr(content[0], 'text', None) or ""
+        return "".join(text for text in (getattr(block, 'text', None) for block in content) if text)
+
+    @staticmethod
+    def _system_blocks(system_prompt: str) -> List[Dict[str, Any]]:
+        """System prompt as a content block marked for prompt caching; it is the same on every request."""
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+    @staticmethod
+    def _user_messages(query: str, context: str = '') -> List[Dict[str, Any]]:
+        """
+        User turn for a request. The query (instructions shared across products) is its own
+        block with a cache breakpoint, so only the per-product context is processed fresh.
+        Prefixes under the model's minimum cacheable length are simply not cached.
+        """
+        content = []
+        if query:
+            content.append({"type": "text", "text": query, "cache_control": {"type": "ephemeral"}})
+        if context or not content:
+            content.append({"type": "text", "text": context})
+        return [{"role": "user", "content": content}]
+
+    def _invoke(self, query: str, context: str, model: str, temperature: float, system_prompt: str) -> str:
+        """Send one Messages request and return its text; identical prompts are answered from the response cache."""
+        cache_key = self._response_cache_key(model, temperature, system_prompt, query + context)
+        response_text = self._get_cached_response(cache_key)
+        if response_text is None:
+            message = self.client.messages.create(
+                model=model,
+                max_tokens=5000,
+                temperature=temperature,
+                system=self._system_blocks(system_prompt),
+                messages=self._user_messages(query, context)
+            )
+            response_text = self._message_text(message)
+            self._cache_response(cache_key, response_text)
+        return response_text
 
     def search(self, query: str, context: str = '', 
                model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
-               system_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+               system_prompt: Optional[str] = None,
+               on_text: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
         """
         Execute Claude API call with provided query and return results.
         
@@ -21,6 +173,8 @@ class ClaudeQuery:
             model: Claude model to use
             temperature: Response creativity (0.0-1.0)
             system_prompt: Optional system prompt override
+            on_text: Optional callback; when given the response is streamed and on_text is
+                called with the text received so far after each piece (e.g. to update a UI)
             
         Returns:
             List of dictionaries containing parsed results, or error if parsing fails
@@ -29,74 +183,105 @@ class ClaudeQuery:
             system_prompt = "You are an AI assistant that provides helpful and accurate responses."
         
         try:
-            message = self.client.messages.create(
-                model=model,
-                max_tokens=5000,
-                temperature=temperature,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": query + context
-                            }
-                        ]
-                    }
-                ]
-            )
-            
-            # Extract text content from the response
-            response_text = ""
-            for content_block in message.content:
-                if hasattr(content_block, 'text'):
-                    response_text += content_block.text
-            
-            print("CLAUDE RESPONSE")
-            print(self._parse_response(response_text))
-            return self._parse_response(response_text)
+            if on_text is None:
+                response_text = self._invoke(query, context, model, temperature, system_prompt)
+            else:
+                response_text = ""
+                for piece in self._stream_text(query, context, model, temperature, system_prompt):
+                    response_text += piece
+                    on_text(response_text)
+            parsed = self._parse_response(response_text)
+            logger.debug("Claude response parsed: %s", parsed)
+            return parsed
             
         except Exception as e:
-            print(query+context)
-            print(f"Error in API call: {e}")
+            logger.debug("Failed prompt: %s", query + context)
+            logger.error("Error in API call: %s", e)
             return [{"error": str(e)}]
 
-    def _parse_response(self, response_text: str) -> List[Dict[str, Any]]:
-        try:
-            # Try to parse as single JSON object first
-            if response_text.strip().startswith('{'):
-                results = json.loads(response_text.strip())
-                return [results]
-            
-            # Try to parse as JSON array
-            elif response_text.strip().startswith('['):
-                results = json.loads(response_text.strip())
-                return results
+    def search_with_tool(self, query: str, tool: Dict[str, Any], context: str = '',
+                         model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
+                         system_prompt: Optional[str] = None,
+                         on_text: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Structured-output counterpart of search: Claude is made to answer by calling `tool`,
+        so the result is the tool input, already parsed and shaped by its input_schema.
+        
+        Args:
+            query: The query/prompt to send to Claude
+            tool: Tool definition ({"name", "description", "input_schema"})
+            context: Additional context to append to the query
+            model: Claude model to use
+            temperature: Response creativity (0.0-1.0)
+            system_prompt: Optional system prompt override
+            on_text: Optional callback; when given the response is streamed and on_text is
+                called with the tool input JSON received so far after each piece
             
-            # Try to extract JSON from text
+        Returns:
+            List holding the tool input dictionary (same shape as search), or error if the call fails
+        """
+        if system_prompt is None:
+            system_prompt = "You are an AI assistant that provides helpful and accurate responses."
+        
+        cache_key = self._response_cache_key(model, temperature, system_prompt,
+                                             json.dumps(tool, sort_keys=True) + query + context)
+        input_json = self._get_cached_response(cache_key)
+        if input_json is not None:
+            return [json_loads(input_json)]
+        
+        params = {
+            "model": model,
+            "max_tokens": 5000,
+            "temperature": temperature,
+            "system": self._system_blocks(system_prompt),
+            "messages": self._user_messages(query, context),
+            "tools": [tool],
+            "tool_choice": {"type": "tool", "name": tool["name"]},
+        }
+        try:
+            if on_text is None:
+                message = self.client.messages.create(**params)
             else:
-                # Look for JSON-like content between braces
-                import re
-                json_matches = re.findall(r'\{[^{}]*\}', response_text, re.DOTALL)
-                results = []
-                for match in json_matches:
-                    try:
-                        results.append(json.loads(match))
-                    except json.JSONDecodeError:
-                        continue
-                
-                # If no JSON found, return the raw text
-                if not results:
-                    return [{"response": response_text}]
-                
-                return results
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Response text: {response_text[:500]}...")
-            # Return raw text if JSON parsing fails
-            return [{"response": response_text, "parse_error": str(e)}]
+                partial_json = ""
+                with self.client.messages.stream(**params) as stream:
+                    for event in stream:
+                        if event.type == "input_json":
+                            partial_json += event.partial_json
+                            on_text(partial_json)
+                    message = stream.get_final_message()
+            tool_input = next(block.input for block in message.content if block.type == "tool_use")
+        except Exception as e:
+            logger.debug("Failed prompt: %s", query + context)
+            logger.error("Error in API call: %s", e)
+            return [{"error": str(e)}]
+        
+        self._cache_response(cache_key, json.dumps(tool_input))
+        return [tool_input]
+
+    def _parse_response(self, response_text: str) -> List[Dict[str, Any]]:
+        stripped = response_text.strip()
+        # The prompt asks for JSON only, so the whole response normally parses directly
+        if stripped[:1] in ('{', '['):
+            try:
+                results = json_loads(stripped)
+                return results if isinstance(results, list) else [results]
+            except json.JSONDecodeError as e:
+                logger.warning("JSON parsing error: %s", e)
+                logger.debug("Response text: %.500s...", response_text)
+
+        # Otherwise extract the JSON objects embedded in the text
+        results = []
+        for match in _iter_json_objects(response_text):
+            try:
+                results.append(json_loads(match))
+            except json.JSONDecodeError:
+                continue
+
+        # If no JSON found, return the raw text
+        if not results:
+            return [{"response": response_text}]
+
+        return results
 
     def get_raw_response(self, query: str, context: str = '', 
                         model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
@@ -118,32 +303,198 @@ class ClaudeQuery:
             system_prompt = "You are an AI assistant that provides helpful and accurate responses."
         
         try:
-            message = self.client.messages.create(
-                model=model,
-                max_tokens=5000,
-                temperature=temperature,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": query + context
-                            }
-                        ]
-                    }
-                ]
-            )
-            
-            # Extract text content from the response
-            response_text = ""
-            for content_block in message.content:
-                if hasattr(content_block, 'text'):
-                    response_text += content_block.text
+            return self._invoke(query, context, model, temperature, system_prompt)
             
-            return response_text
+        except Exception as e:
+            logger.error("Error in API call: %s", e)
+            return f"Error: {str(e)}"
+
+    def create_batch(self, queries: List[str], model: str = "claude-3-7-sonnet-20250219",
+                     temperature: float = 0.8, system_prompt: Optional[str] = None,
+                     poll_interval: float = 5.0, shared_prefix: str = '',
+                     timeout: float = BATCH_TIMEOUT_SECONDS) -> List[Any]:
+        """
+        Submit one request per query through the Message Batches API and wait for the batch to end.
+        
+        Args:
+            queries: Prompts to send, one request each
+            model: Claude model to use
+            temperature: Response creativity (0.0-1.0)
+            system_prompt: Optional system prompt override
+            poll_interval: Seconds to wait between batch status checks
+            shared_prefix: Instructions sent ahead of every query as a prompt-cached block
+            timeout: Seconds to wait for the batch to end; past that it is canceled and
+                TimeoutError is raised
             
+        Returns:
+            List aligned with queries holding the Message for each succeeded request,
+            or an Exception describing why that request did not succeed
+        """
+        if system_prompt is None:
+            system_prompt = "You are an AI assistant that provides helpful and accurate responses."
+        
+        batch_requests = [
+            {
+                "custom_id": str(i),
+                "params": {
+                    "model": model,
+                    "max_tokens": 5000,
+                    "temperature": temperature,
+                    "system": self._system_blocks(system_prompt),
+                    "messages": self._user_messages(shared_prefix, text)
+                }
+            }
+            for i, text in enumerate(queries)
+        ]
+        
+        batch = self.client.messages.batches.create(requests=batch_requests)
+        deadline = time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                try:
+                    self.client.messages.batches.cancel(batch.id)
+                except Exception as e:
+                    logger.warning("Could not cancel batch %s: %s", batch.id, e)
+                raise TimeoutError(f"Batch {batch.id} did not end within {timeout:.0f}s; canceled")
+            time.sleep(poll_interval)
+            batch = self.client.messages.batches.retrieve(batch.id)
+        
+        messages = [Exception("No result returned for batch request")] * len(queries)
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                messages[int(entry.custom_id)] = entry.result.message
+            else:
+                messages[int(entry.custom_id)] = Exception(f"Batch request {entry.result.type}")
+        return messages
+
+    def batch_raw_responses(self, contexts: List[str], query: str = '',
+                            model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
+                            system_prompt: Optional[str] = None) -> List[str]:
+        """
+        Batched counterpart of get_raw_response: one Message Batches request for all contexts.
+        
+        Returns:
+            Raw text responses in the order of contexts ("Error: ..." for failed requests)
+        """
+        try:
+            messages = self.create_batch(contexts, model=model, temperature=temperature,
+                                         system_prompt=system_prompt, shared_prefix=query)
         except Exception as e:
-            print(f"Error in API call: {e}")
-            return f"Error: {str(e)}"
\ No newline at end of file
+            logger.error("Error in batch API call: %s", e)
+            return [f"Error: {str(e)}"] * len(contexts)
+        
+        responses = []
+        for message in messages:
+            if isinstance(message, Exception):
+                responses.append(f"Error: {str(message)}")
+                continue
+            response_text = self._message_text(message)
+            responses.append(response_text)
+        return responses
+
+    def batch_search(self, contexts: List[str], query: str = '',
+                     model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
+                     system_prompt: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Batched counterpart of search: one Message Batches request for all contexts.
+        
+        Returns:
+            Parsed results (same shape as search) in the order of contexts
+        """
+        try:
+            messages = self.create_batch(contexts, model=model, temperature=temperature,
+                                         system_prompt=system_prompt, shared_prefix=query)
+        except Exception as e:
+            logger.error("Error in batch API call: %s", e)
+            return [[{"error": str(e)}] for _ in contexts]
+        
+        results = []
+        for message in messages:
+            if isinstance(message, Exception):
+                results.append([{"error": str(message)}])
+                continue
+            response_text = self._message_text(message)
+            results.append(self._parse_response(response_text))
+        return results
+
+    async def _search_concurrently(self, query: str, contexts: List[str], model: str, temperature: float,
+                                   system_prompt: str, concurrency: int) -> List[List[Dict[str, Any]]]:
+        """Send one Messages request per context with at most `concurrency` in flight."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # A client per run: its connection pool belongs to this run's event loop, which
+        # asyncio.run closes when the run ends
+        async with anthropic.AsyncAnthropic(api_key=self._api_key) as client:
+            async def search_one(context: str) -> List[Dict[str, Any]]:
+                async with semaphore:
+                    try:
+                        message = await client.messages.create(
+                            model=model,
+                            max_tokens=5000,
+                            temperature=temperature,
+                            system=self._system_blocks(system_prompt),
+                            messages=self._user_messages(query, context)
+                        )
+                    except Exception as e:
+                        logger.error("Error in API call: %s", e)
+                        return [{"error": str(e)}]
+                response_text = self._message_text(message)
+                return self._parse_response(response_text)
+
+            return await asyncio.gather(*[search_one(context) for context in contexts])
+
+    def generate_multiple_products(self, product_contexts: List[str], query: str = '',
+                                   model: str = "claude-3-7-sonnet-20250219", temperature: float = 0.8,
+                                   system_prompt: Optional[str] = None, batch_size: int = 10,
+                                   min_batch_api_size: int = 20) -> List[List[Dict[str, Any]]]:
+        """
+        Run search for many products at once.
+        
+        Large sets go through the Message Batches API as a single job. Sets smaller than
+        min_batch_api_size (where batch queueing latency would dominate) are sent as concurrent
+        requests instead, with at most batch_size in flight.
+        
+        Args:
+            product_contexts: Context for each product, appended to the query
+            query: The query/prompt shared by every product
+            model: Claude model to use
+            temperature: Response creativity (0.0-1.0)
+            system_prompt: Optional system prompt override
+            batch_size: Maximum concurrent requests for the non-batch path
+            min_batch_api_size: Smallest number of products sent through the Batches API
+            
+        Returns:
+            Parsed results (same shape as search) in the order of product_contexts
+        """
+        if not product_contexts:
+            return []
+        if len(product_contexts) >= min_batch_api_size:
+            return self.batch_search(product_contexts, query=query, model=model,
+                                     temperature=temperature, system_prompt=system_prompt)
+        
+        if system_prompt is None:
+            system_prompt = "You are an AI assistant that provides helpful and accurate responses."
+        return asyncio.run(self._search_concurrently(query, product_contexts, model, temperature,
+                                                     system_prompt, batch_size))
+
+    def _stream_text(self, query: str, context: str, model: str, temperature: float,
+                     system_prompt: str) -> Iterator[str]:
+        """Yield response text pieces as they are generated; cached responses are yielded whole."""
+        cache_key = self._response_cache_key(model, temperature, system_prompt, query + context)
+        response_text = self._get_cached_response(cache_key)
+        if response_text is not None:
+            yield response_text
+            return
+        
+        pieces = []
+        with self.client.messages.stream(
+            model=model,
+            max_tokens=5000,
+            temperature=temperature,
+            system=self._system_blocks(system_prompt),
+            messages=self._user_messages(query, context)
+        ) as stream:
+            for piece in stream.text_stream:
+                pieces.append(piece)
+                yield piece
+        self._cache_response(cache_key, "".join(pieces))
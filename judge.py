@@ -1,13 +1,55 @@
 import json
 import requests
-from typing import Dict, Any, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple, List
 from dataclasses import dataclass
 import logging
+try:
+    # orjson serializes metadata and parses verdicts several times faster than the stdlib;
+    # its JSONDecodeError subclasses json.JSONDecodeError, so the handlers work with either
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Score fields every judge result must carry
+_SCORE_FIELDS = ('factual_accuracy', 'hallucination_check', 'tone_appropriateness', 'overall_score')
+
+# Fixed parts of the judge prompt; only the metadata and description vary per call.
+# Kept terse: every token here is paid for on every evaluation.
+_PROMPT_PREFIX = """Judge a retail product description against its metadata. Score each 0.0-1.0:
+factual_accuracy: description matches the metadata facts (price, features, specifications)
+hallucination_check: 1.0 = no claims unsupported by the metadata, 0.0 = many
+tone_appropriateness: professional, engaging and suitable for retail customers
+overall_score: average of the three
+
+METADATA:
+"""
+
+_PROMPT_MIDDLE = """
+DESCRIPTION:
+"""
+
+_PROMPT_SUFFIX = """
+Reply with JSON only: {"factual_accuracy":0.0,"hallucination_check":0.0,"tone_appropriateness":0.0,"overall_score":0.0,"comments":"<specific improvements>"}"""
+
+def _dumps_compact(obj: Any) -> str:
+    """Serialize obj as single-line JSON with sorted keys, using orjson when available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+        except TypeError:
+            # Types orjson can't handle (e.g. non-str keys) fall through to the stdlib
+            pass
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
 @dataclass
 class JudgeResult:
     """Structure for judge evaluation results"""
@@ -36,6 +78,20 @@ class LLMProductJudge:
             "Authorization": f"Bearer {api_token}",
             "Content-Type": "application/json"
         }
+        
+        # Pooled session so repeated judgements reuse the HTTPS connection; judging is
+        # idempotent, so POSTs are retried on throttling and transient server errors
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.5,
+                              status_forcelist=[429, 500, 502, 503, 504],
+                              allowed_methods=frozenset(["POST"]))
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
     
     def _call_llama_api(self, prompt: str) -> str:
         """
@@ -57,9 +113,8 @@ class LLMProductJudge:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.endpoint,
-                headers=self.headers,
                 json=payload,
                 timeout=30
             )
@@ -75,7 +130,7 @@ class LLMProductJudge:
                 return result.get('output', str(result))
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"API call failed: {e}")
+            logger.error("API call failed: %s", e)
             raise Exception(f"Failed to call Databricks API: {e}")
     
     def _create_judge_prompt(self, metadata: Dict[str, Any], description: str) -> str:
@@ -89,39 +144,10 @@ class LLMProductJudge:
         Returns:
             Formatted prompt string
         """
-        metadata_str = json.dumps(metadata, indent=2)
-        
-        prompt = f"""You are an expert product evaluation judge. Your task is to evaluate a product description against its metadata across three key dimensions:
-
-1. FACTUAL ACCURACY: How well does the description match the facts in the metadata?
-2. HALLUCINATION CHECK: Are there any false claims or invented details not supported by the metadata?
-3. TONE APPROPRIATENESS: Is the tone suitable for a customer-facing retail environment?
-
-PRODUCT METADATA:
-{metadata_str}
-
-PRODUCT DESCRIPTION:
-{description}
-
-Please evaluate and provide your assessment in the following JSON format:
-{{
-    "factual_accuracy": <score 0.0-1.0>,
-    "hallucination_check": <score 0.0-1.0, where 1.0 means no hallucinations>,
-    "tone_appropriateness": <score 0.0-1.0>,
-    "overall_score": <average score 0.0-1.0>,
-    "comments": "<specific feedback and suggested improvements>"
-}}
-
-EVALUATION CRITERIA:
-- Factual Accuracy: Check if description aligns with metadata facts (price, features, specifications, etc.)
-- Hallucination Check: Identify any claims not supported by metadata (1.0 = no false claims, 0.0 = many false claims)
-- Tone Appropriateness: Assess if language is professional, engaging, and suitable for retail customers
-
-Provide constructive feedback in comments focusing on specific improvements needed.
-
-Response (JSON only):"""
+        # Compact, key-sorted JSON: pretty-print whitespace only costs prompt tokens
+        metadata_str = _dumps_compact(metadata)
         
-        return prompt
+        return _PROMPT_PREFIX + metadata_str + _PROMPT_MIDDLE + description + _PROMPT_SUFFIX
     
     def judge_product_description(self, metadata: Dict[str, Any], description: str) -> Dict[str, Any]:
         """
@@ -148,24 +174,19 @@ Response (JSON only):"""
                 elif response.startswith('```'):
                     response = response[3:-3]
                 
-                result = json.loads(response)
-                
-                # Validate and ensure all required fields exist
-                required_fields = ['factual_accuracy', 'hallucination_check', 'tone_appropriateness', 'overall_score', 'comments']
-                for field in required_fields:
-                    if field not in result:
-                        result[field] = 0.0 if field != 'comments' else "Evaluation incomplete"
+                result = _json_loads(response)
                 
-                # Ensure scores are within valid range
-                for score_field in ['factual_accuracy', 'hallucination_check', 'tone_appropriateness', 'overall_score']:
-                    if score_field in result:
-                        result[score_field] = max(0.0, min(1.0, float(result[score_field])))
+                # Fill in missing scores and clamp each into [0.0, 1.0] in a single pass
+                for score_field in _SCORE_FIELDS:
+                    value = result.get(score_field)
+                    result[score_field] = 0.0 if value is None else max(0.0, min(1.0, float(value)))
+                result.setdefault('comments', "Evaluation incomplete")
                 
                 return result
                 
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
-                logger.error(f"Raw response: {response}")
+                logger.error("Failed to parse JSON response: %s", e)
+                logger.error("Raw response: %s", response)
                 
                 # Return fallback result
                 return {
@@ -177,7 +198,7 @@ Response (JSON only):"""
                 }
                 
         except Exception as e:
-            logger.error(f"Evaluation failed: {e}")
+            logger.error("Evaluation failed: %s", e)
             return {
                 "factual_accuracy": 0.0,
                 "hallucination_check": 0.0,
@@ -186,6 +207,20 @@ Response (JSON only):"""
                 "comments": f"Evaluation failed due to error: {str(e)}"
             }
 
+    def judge_batch(self, pairs: List[Tuple[Dict[str, Any], str]], max_workers: int = 8) -> List[Dict[str, Any]]:
+        """
+        Judge several (metadata, description) pairs concurrently over the pooled session
+        
+        Args:
+            pairs: List of (metadata, description) tuples to evaluate
+            max_workers: Maximum number of evaluations in flight at once
+            
+        Returns:
+            List of evaluation results in the same order as pairs
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda pair: self.judge_product_description(*pair), pairs))
+
 # Example usage and testing
 def main():
     """Example usage of the LLM Product Judge"""
@@ -1,6 +1,58 @@
 import csv
+import itertools
+import mmap
 import os # Import the os module for file path operations
+import re
 import datetime # Import the datetime module for timestamping
+try:
+  # Optional: pyarrow's multi-threaded C++ reader parses quoted files much faster than csv.reader
+  import pyarrow as pa
+  import pyarrow.csv as pacsv
+except ImportError:
+  pa = None
+  pacsv = None
+
+# Read buffer for csv.reader and block size for pyarrow's reader
+READ_BUFFER_BYTES = 1 << 20
+
+def _new_output_path(directory_path):
+   """
+   Returns the path of a new 'output(YYYY-MM-DD_HH-MM-SS).txt' file in directory_path,
+   creating the directory if it doesn't exist.
+   """
+   # Ensure the directory exists, create it if it doesn't
+   # exist_ok=True prevents an error if the directory already exists
+   os.makedirs(directory_path, exist_ok=True)
+
+   # Get the current timestamp
+   now = datetime.datetime.now()
+   # Format the timestamp as YYYY-MM-DD_HH-MM-SS
+   timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
+   # Create the new filename
+   new_filename = f"output({timestamp}).txt"
+   # Combine the directory path with the new filename
+   return os.path.join(directory_path, new_filename)
+
+
+def open_output_file(directory_path, buffering=1 << 20):
+   """
+   Opens a new timestamped output file for writing, for callers that produce their
+   output piece by piece instead of handing a complete string to save.
+
+   Uses the same 'output(YYYY-MM-DD_HH-MM-SS).txt' naming as save.
+
+   Args:
+      directory_path (str): The path to the directory where the file should be created.
+                            If the directory doesn't exist, it will be created.
+      buffering (int): Write buffer size in bytes (1 MiB by default).
+
+   Returns:
+      file: A text file object opened for writing; close it (or use it in a with block) when done.
+   """
+   file_path = _new_output_path(directory_path)
+   print(f"Creating new file: '{file_path}'")
+   return open(file_path, mode='w', encoding='utf-8', buffering=buffering)
+
 
 class save:
    """
@@ -21,31 +73,23 @@ class save:
                      each item is written on a new line. Otherwise,
                      the string representation of the data is written.
       """
+      file_path = None
       try:
-          # Ensure the directory exists, create it if it doesn't
-          # exist_ok=True prevents an error if the directory already exists
-          os.makedirs(directory_path, exist_ok=True)
-
-          # Get the current timestamp
-          now = datetime.datetime.now()
-          # Format the timestamp as YYYY-MM-DD_HH-MM-SS
-          timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
-          # Create the new filename
-          new_filename = f"output({timestamp}).txt"
-          # Combine the directory path with the new filename
-          file_path = os.path.join(directory_path, new_filename)
+          file_path = _new_output_path(directory_path)
 
           print(f"Creating new file: '{file_path}'")
 
-          # Open the new file in write mode
-          # 'w' mode creates the file
-          with open(file_path, mode='w', encoding='utf-8') as f:
-              if isinstance(data, (list, tuple)):
-                  # Write each item of the list/tuple on a new line
-                  f.writelines(str(item) + '\n' for item in data)
-              else:
-                  # Write the string representation of the data
-                  f.write(str(data))
+          if isinstance(data, (list, tuple)):
+              # Each item of the list/tuple goes on a new line
+              payload = ('\n'.join(map(str, data)) + '\n' if data else '').encode('utf-8')
+          else:
+              # The string representation of the data
+              payload = str(data).encode('utf-8')
+
+          # Write the whole encoded payload with a single unbuffered write
+          # 'wb' mode creates the file
+          with open(file_path, mode='wb', buffering=0) as f:
+              f.write(payload)
           print(f"Data successfully saved to '{file_path}'")
 
       except OSError as e:
@@ -60,26 +104,41 @@ class CsvData:
   """
   Represents data read from a pipe-delimited ('|') file.
 
-  Reads a pipe-delimited file upon instantiation and stores the data.
-  Provides methods to access the data like a list (e.g., len(), indexing).
+  Memory-maps the file upon instantiation and indexes where each line starts; rows are
+  only split into fields when they are accessed. Provides methods to access the data like
+  a list (e.g., len(), indexing).
+
+  Files containing quote characters are parsed eagerly instead (with pyarrow when it is
+  installed, otherwise csv.reader), since a quoted field may contain the delimiter or span
+  several lines, and so are files with bare '\r' line endings, which the line index doesn't
+  split on. engine="pyarrow" parses every file eagerly with pyarrow.
+
+  Call close() (or use the object in a with block) to release the memory map when done.
 
   Attributes:
     file_path (str): The path to the CSV file provided during instantiation.
     data (list): A list of lists representing the CSV data. Empty if loading failed.
+                 Built on access, so prefer indexing when only some rows are needed.
     header (list): The first row of the CSV, assumed to be the header. Empty if no data.
     loaded_successfully (bool): True if the file was read without errors, False otherwise.
   """
-  def __init__(self, file_path):
+  def __init__(self, file_path, engine=None):
     """
     Initializes the CsvData object by reading the specified pipe-delimited file.
 
     Args:
       file_path (str): The path to the pipe-delimited file.
+      engine (str): None to split rows lazily from a memory map, or "pyarrow" to parse the
+                    whole file up front with pyarrow's multi-threaded reader (ignored if
+                    pyarrow isn't installed).
     """
     self.file_path = file_path
-    self.data = []
     self.header = []
     self.loaded_successfully = False
+    self._rows = []          # Parsed rows, only used when the file is read eagerly
+    self._mm = None          # Memory map of the file for lazy row access
+    self._line_offsets = []  # Start offset of each line, followed by the end of the file
+    self._data_rows = range(0)  # Row numbers of the data rows, header excluded
 
     try:
       # Check if the file exists before trying to open it
@@ -87,22 +146,37 @@ class CsvData:
           print(f"Error: File not found at '{self.file_path}'")
           return # Exit __init__ early
 
-      # Open the CSV file for reading
-      # 'newline=''' prevents extra blank rows from being read on some systems
-      with open(self.file_path, mode='r', newline='', encoding='utf-8') as csvfile:
-        # Create a CSV reader object, specifying the pipe delimiter
-        csv_reader = csv.reader(csvfile, delimiter='|')
+      with open(self.file_path, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:
+          self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-        # Read all rows into the data attribute
-        self.data = list(csv_reader) # More concise way to read all rows
+      if self._mm is not None and ((engine == "pyarrow" and pacsv is not None) or self._mm.find(b'"') != -1
+                                   or re.search(rb'\r(?!\n)', self._mm)):
+        # Quoted fields and '\r'-only line endings need the full csv parser (and engine="pyarrow"
+        # asks for it); read the file the eager way
+        self._mm.close()
+        self._mm = None
+        self._rows = self._read_eager()
+      elif self._mm is not None:
+        # One pass over the mapping to record where each line starts
+        offsets = [0]
+        pos = self._mm.find(b'\n')
+        while pos != -1:
+          offsets.append(pos + 1)
+          pos = self._mm.find(b'\n', pos + 1)
+        if offsets[-1] != len(self._mm):
+          offsets.append(len(self._mm))
+        self._line_offsets = offsets
 
       # Check if any data was actually read
-      if not self.data:
+      if self._row_count() == 0:
           print(f"Warning: The file '{self.file_path}' is empty or could not be read properly.")
       else:
           # Assume the first row is the header
-          self.header = self.data[0]
+          self.header = self._row(0)
           self.loaded_successfully = True # Mark as successfully loaded
+      # Data rows start after the header, so indexing never has to adjust for it
+      self._data_rows = range(1 if self.header else 0, self._row_count())
 
     except FileNotFoundError:
       # This case is less likely now due to the os.path.exists check, but good practice
@@ -111,10 +185,80 @@ class CsvData:
       # Handle other potential errors during file reading or processing
       print(f"An error occurred while reading '{self.file_path}': {e}")
 
+  def close(self):
+    """Releases the memory map; rows can't be read from a lazily indexed file afterwards."""
+    if self._mm is not None:
+      self._mm.close()
+
+  def __enter__(self):
+    """Returns the object itself, so it can be opened in a with block."""
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    """Closes the object at the end of the with block."""
+    self.close()
+
+  def _read_eager(self):
+    """
+    Parses the whole file into a list of rows, honouring quoted fields.
+
+    pyarrow's rows match csv.reader's: blank lines are kept, and a UTF-8 byte order mark
+    stays at the start of the first header field (pyarrow skips it, csv.reader doesn't).
+    """
+    # 'newline=''' prevents extra blank rows from being read on some systems
+    with open(self.file_path, mode='r', newline='', encoding='utf-8', buffering=READ_BUFFER_BYTES) as csvfile:
+      # Create a CSV reader object, specifying the pipe delimiter
+      reader = csv.reader(csvfile, delimiter='|')
+      if pacsv is None:
+        return list(reader)
+      first_row = next(reader, None)
+      if first_row is None or len(first_row) < 2:
+        # With one column pyarrow can't tell a blank line (csv.reader's []) from an empty field
+        return [] if first_row is None else [first_row, *reader]
+
+    try:
+      # Keep every field as a string, like csv.reader; the header is read as row 0
+      column_types = {f"f{i}": pa.string() for i in range(len(first_row))}
+      table = pacsv.read_csv(
+        self.file_path,
+        read_options=pacsv.ReadOptions(autogenerate_column_names=True, block_size=READ_BUFFER_BYTES),
+        parse_options=pacsv.ParseOptions(delimiter='|', newlines_in_values=True, ignore_empty_lines=False),
+        convert_options=pacsv.ConvertOptions(column_types=column_types),
+      )
+      rows = [list(row) for row in zip(*(column.to_pylist() for column in table.columns))]
+      if rows and first_row[0].startswith('\ufeff'):
+        rows[0][0] = '\ufeff' + rows[0][0]
+      return rows
+    except pa.ArrowInvalid:
+      # pyarrow rejects ragged rows (a blank line in a multi-column file is one), which csv.reader accepts
+      with open(self.file_path, mode='r', newline='', encoding='utf-8', buffering=READ_BUFFER_BYTES) as csvfile:
+        return list(csv.reader(csvfile, delimiter='|'))
+
+  def _row_count(self):
+    """Returns the number of rows in the file, including the header."""
+    if self._mm is not None:
+      return len(self._line_offsets) - 1
+    return len(self._rows)
+
+  def _row(self, row_index):
+    """Returns the fields of a row, counting the header as row 0."""
+    if self._mm is None:
+      return self._rows[row_index]
+    line = self._mm[self._line_offsets[row_index]:self._line_offsets[row_index + 1]]
+    line = line.decode('utf-8').rstrip('\r\n')
+    # Without quote characters in the file, csv.reader splitting is a plain split on '|'
+    return line.split('|') if line else []
+
+  @property
+  def data(self):
+    """All rows of the file (header included) as a list of lists."""
+    if self._mm is None:
+      return self._rows
+    return [self._row(i) for i in range(self._row_count())]
+
   def __len__(self):
     """Returns the number of data rows (excluding the header)."""
-    # Return 0 if no data or only a header row exists
-    return max(0, len(self.data) - 1) if self.header else len(self.data)
+    return len(self._data_rows)
 
   def __getitem__(self, index):
     """
@@ -122,22 +266,17 @@ class CsvData:
     Index 0 corresponds to the first data row (after the header).
     Raises IndexError if the index is out of bounds.
     """
-    if not self.loaded_successfully:
-        raise IndexError("CSV data not loaded successfully.")
-
-    if self.header:
-        # Adjust index to skip the header row
-        actual_index = index + 1
-        if 0 <= index < len(self.data) - 1:
-             return self.data[actual_index]
-        else:
-            raise IndexError(f"Row index {index} out of range for data rows.")
-    else:
-        # No header, access directly
-        if 0 <= index < len(self.data):
-            return self.data[index]
-        else:
-            raise IndexError(f"Row index {index} out of range.")
+    try:
+      row_index = self._data_rows[index]
+    except IndexError:
+      raise IndexError(f"Row index {index} out of range for data rows.") from None
+    return self._row(row_index)
+
+  def __iter__(self):
+    """Iterates over the data rows (excluding the header)."""
+    if self._mm is None:
+      return itertools.islice(self._rows, self._data_rows.start, None)
+    return map(self._row, self._data_rows)
 
   def __str__(self):
     """Returns a string representation showing file path and number of data rows."""
@@ -151,9 +290,20 @@ class CsvData:
 
   def get_data_rows(self):
       """Returns a list containing only the data rows (excluding the header)."""
-      if self.header and self.data:
-          return self.data[1:]
-      elif self.data:
-          return self.data # No header, return all data
-      else:
-          return [] # No data loaded
+      return list(self)
+
+  def get_data_rows_raw(self):
+      """
+      Yields (row, raw_line) for each data row, where raw_line is the row's fields joined
+      with '|' (the line as it appears in the file, when the file has no quoted fields).
+
+      Saves callers that need both the fields and the pipe-delimited line from re-joining them.
+      """
+      if self._mm is None:
+        for row in iter(self):
+          yield row, "|".join(row)
+        return
+      for row_index in self._data_rows:
+        line = self._mm[self._line_offsets[row_index]:self._line_offsets[row_index + 1]]
+        line = line.decode('utf-8').rstrip('\r\n')
+        yield (line.split('|') if line else []), line
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class LLMCache:
+    """
+    Persistent cache of Tavily and Claude responses, backed by a SQLite file.
+
+    Values are stored as JSON, so anything json.dumps accepts (strings, lists of URLs, dicts)
+    can be cached. Safe to use from several threads at once.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+    """
+    def __init__(self, cache_dir):
+        """
+        Opens (or creates) the cache database in cache_dir.
+
+        Args:
+            cache_dir (str): Directory for the cache file. Created if it doesn't exist.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "llm_cache.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache(hash TEXT PRIMARY KEY, value BLOB, ts INTEGER)")
+
+    @staticmethod
+    def key(*parts):
+        """Returns the SHA-256 hex digest identifying a request made of the given parts."""
+        return hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached value for key, or None if there is none."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE hash = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        """Stores value under key, replacing any previous value."""
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cache(hash, value, ts) VALUES (?, ?, ?)",
+                               (key, payload, int(time.time())))
+
+    def delete(self, key):
+        """Removes the value stored under key, if any."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE hash = ?", (key,))
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -3,39 +3,150 @@
 from resources import csv_data
 from resources import tavily_extract
 from resources import claude
-from tkinter import Tk
-from tkinter.filedialog import askopenfilename, askdirectory
+from resources import llm_cache
 import sys # For exiting gracefully
+import asyncio
+import argparse
+import httpx
+import json
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rows searched at the same time; keeps Tavily and Claude under their rate limits
+MAX_CONCURRENT_ROWS = 8
+
+# Rows searched per window: one Claude batch, and the most rows held in memory at once
+WINDOW_ROWS = 100
+
+# HTML tag written for each image URL found for a row
+IMG_TPL = '<img src="{}" alt="Product Image" style="width:200px; height:auto; margin: 5px;" onerror="this.style.display=\'none\'"/> \n'
+# Fixed pieces of each row's output: blank line between sections, and the separator after a row
+NL2 = "\n\n"
+SEP = "\n___\n\n"
+
+# Retries for transient API failures (rate limits, 5xx, timeouts), with jittered exponential backoff
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5 # seconds
+RETRY_MAX_DELAY = 30 # seconds
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+# Each Claude retry is a whole Message Batches round trip, so failed requests get one more try
+CLAUDE_BATCH_ATTEMPTS = 2
+
+# Where Tavily and Claude responses are cached between runs
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+def is_transient_error(e):
+    """True for errors worth retrying: rate limits, server errors, timeouts and dropped connections."""
+    status_code = getattr(e, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    # SDK and HTTP library errors (httpx, requests, anthropic) name their transport failures this way
+    name = type(e).__name__
+    return 'Timeout' in name or 'Connect' in name
+
+
+def backoff_delay(attempt):
+    """Seconds to wait before retry number attempt (1-based): full jitter over an exponential cap."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call_with_retry(func, *args, **kwargs):
+    """
+    Calls func(*args, **kwargs), retrying transient failures up to RETRY_ATTEMPTS times in
+    total. Any other error, or the last transient one, is raised to the caller.
+    """
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == RETRY_ATTEMPTS or not is_transient_error(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("Transient error (%s); retrying in %.1fs (attempt %d of %d)", e, delay, attempt + 1, RETRY_ATTEMPTS)
+            time.sleep(delay)
+
 
 class TavilyClaudeContentGen:
-    def __init__(self):
-        """Initializes the Tavily and Claude clients."""
-        self.tavily_e = tavily_extract.upcExtract()
-        self.claude_client = claude.ClaudeQuery()
+    def __init__(self, use_cache=True, processing_limit=None, concurrency=MAX_CONCURRENT_ROWS,
+                 window_size=WINDOW_ROWS):
+        """
+        Initializes the Tavily and Claude clients.
 
-    def get_data(self):
-        """Prompts the user to select an input CSV file and loads it."""
+        Args:
+            use_cache (bool): Reuse Tavily and Claude responses saved by earlier runs
+                              (and save new ones), and resume from the checkpoint of an
+                              unfinished run. Pass False to always query the APIs.
+            processing_limit (int): Maximum number of rows searched per run; None for all rows.
+            concurrency (int): Maximum number of rows searched at the same time.
+            window_size (int): Number of rows searched and written per window.
+        """
+        self.tavily_e = tavily_extract.upcExtract()
+        # One keep-alive pool for every Claude request in the run, sized for the row concurrency
+        self.http = httpx.Client(limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                                 timeout=httpx.Timeout(600, connect=10))
+        self.claude_client = claude.ClaudeQuery(http_client=self.http)
+        self.use_cache = use_cache
+        self.cache = llm_cache.LLMCache(CACHE_DIR) if use_cache else None
+        self.processing_limit = processing_limit
+        self.concurrency = concurrency
+        self.window_size = window_size
+
+    @staticmethod
+    def ask_path(title, directory=False):
+        """
+        Asks for a file (or directory) with a Tk dialog. Only used when no path was given on
+        the command line; returns None without opening a window when there is no terminal.
+        """
+        if not sys.stdin.isatty():
+            logger.error("%s: no path given and no terminal to ask on.", title)
+            return None
+        # Imported here so headless runs never load Tk
+        from tkinter import Tk
+        from tkinter.filedialog import askopenfilename, askdirectory
         Tk().withdraw() # Keep the root Tkinter window from appearing
-        filename = askopenfilename(title="Select Input Pipe-Delimited File")
+        return askdirectory(title=title) if directory else askopenfilename(title=title)
+
+    def get_data(self, filename=None):
+        """
+        Loads the input CSV file, prompting the user to select one if no filename is given.
+
+        Args:
+            filename (str): Path of the pipe-delimited input file (e.g. from --input).
+        """
+        if filename is None:
+            filename = self.ask_path("Select Input Pipe-Delimited File")
         if not filename:
-            print("No file selected. Exiting.")
+            logger.error("No file selected. Exiting.")
             return None # Return None if user cancels
-        print(f"Loading data from: {filename}")
-        upc_data = csv_data.CsvData(filename)
+        logger.info("Loading data from: %s", filename)
+        upc_data = csv_data.CsvData(filename, engine="pyarrow")
         if not upc_data.loaded_successfully:
-            print(f"Failed to load data from {filename}. Exiting.")
+            logger.error("Failed to load data from %s. Exiting.", filename)
+            upc_data.close()
             return None
         if not upc_data.header:
-            print("Could not find header row in the file. Exiting.")
+            logger.error("Could not find header row in the file. Exiting.")
+            upc_data.close()
             return None
         return upc_data
 
-    def get_column_indices(self, header):
+    def get_column_indices(self, header, preset=None):
         """
         Asks the user to specify which columns to use for searching.
 
         Args:
             header (list): The list of column names from the CSV header.
+            preset (dict): Column selection given on the command line, with the same keys as
+                           the result. Used as-is when it names every column the search type
+                           needs; otherwise the user is asked.
 
         Returns:
             dict: A dictionary containing the selected column indices,
@@ -50,6 +161,22 @@ class TavilyClaudeContentGen:
         indices = {'search_type': None, 'upc': None, 'item_num': None, 'manuf': None, 'desc': None}
         max_index = len(header) - 1
 
+        # --- Use the command line selection when it is complete ---
+        if preset and preset.get('search_type') in (1, 2):
+            needed = ('item_num', 'manuf', 'desc') if preset['search_type'] == 1 else ('upc',)
+            if all(preset.get(key) is not None for key in needed):
+                out_of_range = [key for key in needed if not 0 <= preset[key] <= max_index]
+                if out_of_range:
+                    print(f"Column index out of range for {', '.join(out_of_range)}. Valid columns are 0-{max_index}.")
+                    return None
+                indices['search_type'] = preset['search_type']
+                indices.update((key, preset[key]) for key in needed)
+                print("--- Column Selection Complete ---")
+                return indices
+        if not sys.stdin.isatty():
+            print("Column selection is incomplete and there is no terminal to ask on.")
+            return None
+
         # --- Get Search Type ---
         while True:
             search_choice = input("Select search type:\n  1: Use Item Number, Manufacturer, Description\n  2: Use UPC/EAN\nEnter choice (1 or 2): ").strip()
@@ -95,135 +222,396 @@ class TavilyClaudeContentGen:
         print("--- Column Selection Complete ---")
         return indices
 
-    def claude_tavily_extract(self, upc_data, column_indices):
+    def tavily_text_search(self, i, search_type, search_kwargs):
+        """
+        Runs the Tavily text search for a single row.
+
+        Args:
+            i (int): Zero-based index of the row among the data rows (used for messages).
+            search_type (int): 1 for Item/Manuf/Desc search, 2 for UPC search.
+            search_kwargs (dict): Keyword arguments for the Tavily text search.
+
+        Returns:
+            str: The Tavily output for the row.
+        """
+        if search_type == 1: # Item/Manuf/Desc
+            logger.debug("Row %d: Searching Tavily with: Item='%s', Manuf='%s', Desc='%s'", i + 1,
+                         search_kwargs['item_num'], search_kwargs['manufacturer_name'], search_kwargs['short_description'])
+        else: # UPC Search
+            logger.debug("Row %d: Searching Tavily with UPC: '%s'", i + 1, search_kwargs['upc'])
+        if self.cache is None:
+            return call_with_retry(self.tavily_e.run, **search_kwargs)
+
+        key = llm_cache.LLMCache.key("tavily", search_type, json.dumps(search_kwargs, sort_keys=True))
+        tavily_output = self.cache.get(key)
+        if tavily_output is None:
+            tavily_output = call_with_retry(self.tavily_e.run, **search_kwargs)
+            if tavily_output:
+                self.cache.set(key, tavily_output)
+        else:
+            logger.debug("Row %d: Using cached Tavily results.", i + 1)
+        return tavily_output
+
+    def tavily_image_search(self, i, claude_text):
+        """
+        Runs the Tavily image search for a single row, using Claude's description as the query.
+
+        Returns:
+            list: Image URLs found for the row.
+        """
+        key = llm_cache.LLMCache.key("tavily_images", claude_text)
+        tavily_image_search = self.cache.get(key) if self.cache is not None else None
+        if tavily_image_search is None:
+            tavily_image_search = call_with_retry(self.tavily_e.run, queries=claude_text, include_images=True)
+            if self.cache is not None and tavily_image_search:
+                self.cache.set(key, tavily_image_search)
+        logger.debug("Row %d: Found %d images.", i + 1, len(tavily_image_search))
+        return tavily_image_search
+
+    def claude_batch(self, contexts):
+        """
+        Gets Claude's description for each context through one Message Batches request.
+
+        Requests that fail ("Error: ..." responses) are sent again in a smaller batch, up to
+        CLAUDE_BATCH_ATTEMPTS batches in total, with a jittered backoff in between.
+
+        Returns:
+            list: Response text per context; "Error: ..." for requests that never succeeded.
+        """
+        responses = self.claude_client.batch_raw_responses(contexts)
+        for attempt in range(1, CLAUDE_BATCH_ATTEMPTS):
+            failed = [n for n, response in enumerate(responses) if response.startswith("Error: ")]
+            if not failed:
+                break
+            delay = backoff_delay(attempt)
+            logger.warning("Retrying %d failed Claude requests in %.1fs (attempt %d of %d)",
+                           len(failed), delay, attempt + 1, CLAUDE_BATCH_ATTEMPTS)
+            time.sleep(delay)
+            for n, response in zip(failed, self.claude_client.batch_raw_responses([contexts[n] for n in failed])):
+                responses[n] = response
+        return responses
+
+    async def run_concurrently(self, func, calls):
+        """
+        Runs func(*args) for every args tuple in calls, at most self.concurrency at a time.
+
+        The Tavily and Claude clients are synchronous, so each call runs in a worker thread.
+
+        Returns:
+            list: The result of each call, or the exception it raised, in the order of calls.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_call(args):
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
+
+        return await asyncio.gather(*(run_call(args) for args in calls), return_exceptions=True)
+
+    def run_unique(self, func, calls, key):
+        """
+        Like run_concurrently, but calls with the same key(args) are made only once and the
+        result is shared by every call with that key (e.g. the same UPC on several rows).
+
+        Returns:
+            list: The result of each call, or the exception it raised, in the order of calls.
+        """
+        slots = {} # key -> position in unique_calls
+        unique_calls = []
+        call_slots = []
+        for args in calls:
+            slot = slots.setdefault(key(args), len(unique_calls))
+            if slot == len(unique_calls):
+                unique_calls.append(args)
+            call_slots.append(slot)
+        if len(unique_calls) < len(calls):
+            logger.info("%d duplicate requests share results.", len(calls) - len(unique_calls))
+        results = asyncio.run(self.run_concurrently(func, unique_calls))
+        return [results[slot] for slot in call_slots]
+
+    @staticmethod
+    def described_row_output(output_row_str, claude_text, image_urls):
+        """Returns the output pieces for a row Claude described: row data, description, image tags, separator."""
+        # Original row data, Claude's description, image HTML tags, separator
+        return [output_row_str, NL2, claude_text, NL2, *map(IMG_TPL.format, image_urls), SEP]
+
+    @staticmethod
+    def load_progress(progress_path):
+        """
+        Reads the checkpoint file written by claude_tavily_extract.
+
+        Returns:
+            dict: Row key -> {"key", "row_str", "claude", "images"} for every row finished by an
+                  earlier run. Empty if the file doesn't exist; a truncated last line is ignored.
+        """
+        done = {}
+        if progress_path is None or not os.path.exists(progress_path):
+            return done
+        with open(progress_path, encoding='utf-8') as progress_file:
+            for line in progress_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # Line cut short by a crash
+                done[record["key"]] = record
+        return done
+
+    def claude_tavily_extract(self, upc_data, column_indices, out_file, progress_path=None):
         """
         Processes each row using Tavily and Claude based on selected columns.
 
+        Rows are read lazily and checked for missing input as they are read. Rows that need
+        searching are collected into windows of self.window_size rows; each window goes
+        through process_window and is written to out_file before the next one is read, so
+        memory use stays bounded however large the input is. Output keeps the original row order.
+
         Args:
             upc_data (CsvData): The loaded CSV data object.
             column_indices (dict): Dictionary containing the indices for relevant columns.
+            out_file (file): Text file the results are written to.
+            progress_path (str): JSONL checkpoint file. Every row that finishes successfully is
+                                 appended to it, and rows already in it are written from the
+                                 checkpoint instead of being searched again (they don't count
+                                 towards the processing limit).
 
         Returns:
-            str: A combined string containing the results for all rows.
+            bool: True if every row was processed, False if the run stopped at the processing limit.
         """
-        combined_output = ''
         search_type = column_indices['search_type']
-        upc_idx = column_indices['upc']
-        item_num_idx = column_indices['item_num']
-        manuf_idx = column_indices['manuf']
-        desc_idx = column_indices['desc']
-
-        # Use a counter for the processing limit
-        processed_count = 0
-        processing_limit = 20 # Keep the original limit for now
-
-        for i, row in enumerate(upc_data.get_data_rows()):
-            if processed_count >= processing_limit:
-                print(f"\nReached processing limit of {processing_limit} rows.")
-                break
-
-            print(f"\nProcessing row {i+1}...")
-            # Use pipe delimiter for output consistency with input
-            output_row_str = "|".join(map(str, row))
-            tavily_output = ''
-            tavily_image_search = []
+        # Columns the search type reads, and the shortest row that contains all of them
+        if search_type == 1: # Item/Manuf/Desc
+            needed_idxs = (column_indices['item_num'], column_indices['manuf'], column_indices['desc'])
+        else: # UPC Search
+            needed_idxs = (column_indices['upc'],)
+        min_row_len = max(needed_idxs) + 1
+
+        # None means every row is processed
+        processing_limit = self.processing_limit
+        searched = 0 # Rows sent to Tavily so far
+
+        outputs = [] # Output pieces per row of the current window, in row order; None until processed
+        jobs = [] # (slot in outputs, i, output_row_str, search_kwargs, row_key) for each row to search
+        done = self.load_progress(progress_path)
+        if done:
+            logger.info("Resuming: %d rows were finished by an earlier run.", len(done))
+
+        def emit(pieces):
+            # Rows ahead of any pending search can be written straight away
+            if jobs:
+                outputs.append(pieces)
+            else:
+                out_file.writelines(pieces)
+
+        finished = True # False once the processing limit stops the run early
+        progress_file = open(progress_path, 'a', encoding='utf-8') if progress_path else None
+        try:
+            # Each row comes with its pipe-delimited line, for output consistency with input
+            for i, (row, output_row_str) in enumerate(upc_data.get_data_rows_raw()):
+                row_key = llm_cache.LLMCache.key(search_type, output_row_str)
+                record = done.get(row_key)
+                if record is not None:
+                    emit(self.described_row_output(output_row_str, record["claude"], record["images"]))
+                    continue # Finished by an earlier run
+
+                if processing_limit is not None and searched >= processing_limit:
+                    logger.info("Reached processing limit of %d rows.", processing_limit)
+                    finished = False
+                    break
+
+                # Rows too short for the selected columns count as missing data
+                values = tuple(map(row.__getitem__, needed_idxs)) if len(row) >= min_row_len else None
 
-            try:
-                # --- Perform Tavily Search ---
                 if search_type == 1: # Item/Manuf/Desc
-                    # Safely get data using indices
-                    item_num = row[item_num_idx] if item_num_idx < len(row) else None
-                    manuf_name = row[manuf_idx] if manuf_idx < len(row) else None
-                    short_desc = row[desc_idx] if desc_idx < len(row) else None
-
-                    if not all([item_num, manuf_name, short_desc]):
-                         print(f"  Warning: Missing required data in row {i+1} for Item/Manuf/Desc search. Skipping Tavily search.")
-                         combined_output += f"{output_row_str}\n\nNo results found (missing input data)\n\n___\n\n"
+                    if values is not None:
+                        item_num, manuf_name, short_desc = values
+                    if values is None or not (item_num and manuf_name and short_desc):
+                         logger.warning("Missing required data in row %d for Item/Manuf/Desc search. Skipping Tavily search.", i + 1)
+                         emit((output_row_str, "\n\nNo results found (missing input data)\n\n___\n\n"))
                          continue # Skip to next row
-
-                    print(f"  Searching Tavily with: Item='{item_num}', Manuf='{manuf_name}', Desc='{short_desc}'")
-                    tavily_output = self.tavily_e.run(item_num=item_num, manufacturer_name=manuf_name, short_description=short_desc)
+                    search_kwargs = {'item_num': item_num, 'manufacturer_name': manuf_name, 'short_description': short_desc}
 
                 else: # UPC Search
-                    upc = row[upc_idx] if upc_idx < len(row) else None
+                    upc = values[0] if values is not None else None
                     if not upc:
-                        print(f"  Warning: Missing UPC data in row {i+1}. Skipping Tavily search.")
-                        combined_output += f"{output_row_str}\n\nNo results found (missing UPC)\n\n___\n\n"
+                        logger.warning("Missing UPC data in row %d. Skipping Tavily search.", i + 1)
+                        emit((output_row_str, "\n\nNo results found (missing UPC)\n\n___\n\n"))
                         continue # Skip to next row
+                    search_kwargs = {'upc': upc}
+
+                jobs.append((len(outputs), i, output_row_str, search_kwargs, row_key))
+                outputs.append(None)
+                searched += 1
+
+                if len(jobs) >= self.window_size:
+                    self.process_window(jobs, outputs, search_type, progress_file)
+                    for pieces in outputs:
+                        out_file.writelines(pieces)
+                    outputs.clear()
+                    jobs.clear()
+
+            if jobs:
+                self.process_window(jobs, outputs, search_type, progress_file)
+            for pieces in outputs:
+                out_file.writelines(pieces)
+        finally:
+            if progress_file is not None:
+                progress_file.close()
+        return finished
+
+    def process_window(self, jobs, outputs, search_type, progress_file=None):
+        """
+        Searches one window of rows and fills in their output.
 
-                    print(f"  Searching Tavily with UPC: '{upc}'")
-                    tavily_output = self.tavily_e.run(upc=upc)
+        The rows go through three stages: concurrent Tavily text searches, a single Claude
+        Message Batches request for every row with results, and concurrent Tavily image
+        searches.
 
-                # --- Process Tavily Results ---
-                if not tavily_output or tavily_output.strip() == '':
-                    print("  Tavily returned no results.")
-                    combined_output += f"{output_row_str}\n\nNo results found via Tavily\n\n___\n\n"
+        Args:
+            jobs (list): (slot in outputs, i, output_row_str, search_kwargs, row_key) per row.
+            outputs (list): Output pieces per row; each job's slot is filled in.
+            search_type (int): 1 for Item/Manuf/Desc search, 2 for UPC search.
+            progress_file (file): Open JSONL checkpoint file for finished rows, or None.
+        """
+        def row_error(job, e):
+            logger.error("An unexpected error occurred processing row %d: %s", job[1] + 1, e)
+            outputs[job[0]] = (job[2], f"\n\nError processing row: {e}\n\n___\n\n")
+
+        # --- Stage 1: Tavily text searches ---
+        logger.info("Searching Tavily for %d rows, up to %d at a time...", len(jobs), self.concurrency)
+        tavily_outputs = self.run_unique(
+            self.tavily_text_search, [(job[1], search_type, job[3]) for job in jobs],
+            key=lambda args: json.dumps(args[2], sort_keys=True))
+
+        found = [] # (job, tavily_output) for rows that Claude should describe
+        for job, tavily_output in zip(jobs, tavily_outputs):
+            if isinstance(tavily_output, Exception):
+                row_error(job, tavily_output)
+            elif not tavily_output or tavily_output.isspace():
+                logger.info("Row %d: Tavily returned no results.", job[1] + 1)
+                outputs[job[0]] = (job[2], "\n\nNo results found via Tavily\n\n___\n\n")
+            else:
+                found.append((job, tavily_output))
+
+        # --- Stage 2: Claude descriptions, one Message Batches request for all rows ---
+        described = [] # (job, claude_text) for rows that need images
+        if found:
+            claude_keys = [llm_cache.LLMCache.key("claude", tavily_output) for _, tavily_output in found]
+            claude_texts = [self.cache.get(key) if self.cache is not None else None for key in claude_keys]
+            missing = [n for n, claude_text in enumerate(claude_texts) if claude_text is None]
+            if len(missing) < len(found):
+                logger.info("Using cached Claude descriptions for %d rows.", len(found) - len(missing))
+            if missing:
+                # Rows with the same Tavily output share one Claude request
+                contexts = list(dict.fromkeys(found[n][1] for n in missing))
+                logger.info("Querying Claude for %d rows (%d unique) in one batch...", len(missing), len(contexts))
+                responses = dict(zip(contexts, self.claude_batch(contexts)))
+                for n in missing:
+                    claude_text = claude_texts[n] = responses[found[n][1]]
+                    if self.cache is not None and claude_text.strip() and not claude_text.startswith("Error: "):
+                        self.cache.set(claude_keys[n], claude_text)
+            for (job, tavily_output), claude_text in zip(found, claude_texts):
+                if claude_text.startswith("Error: "):
+                    row_error(job, claude_text[len("Error: "):])
+                elif not claude_text.strip():
+                    logger.info("Row %d: Claude returned no description.", job[1] + 1)
+                    outputs[job[0]] = (job[2], NL2, tavily_output, "\n\nClaude returned no description.\n\n___\n\n") # Include Tavily output for context
                 else:
-                    print("  Tavily search successful. Querying Claude...")
-                    # --- Query Claude ---
-                    claude_output_obj = self.claude_client.search(tavily_output) # Assuming search returns the message object
-                    claude_text = ''.join(str(content_block.text) for content_block in claude_output_obj if hasattr(content_block, 'text')) # Extract text safely
-
-                    if not claude_text.strip():
-                         print("  Claude returned no description.")
-                         combined_output += f"{output_row_str}\n\n{tavily_output}\n\nClaude returned no description.\n\n___\n\n" # Include Tavily output for context
-                    else:
-                        print("  Claude description generated. Searching for images...")
-                        # --- Get Images from Tavily ---
-                        # Use the generated Claude text to find relevant images
-                        tavily_image_search = self.tavily_e.run(queries=claude_text, include_images=True)
-                        print(f"  Found {len(tavily_image_search)} images.")
-
-                        # --- Combine Output ---
-                        combined_output += f"{output_row_str}\n\n" # Original row data
-                        combined_output += f"{claude_text}\n\n" # Claude's description
-                        # Add image HTML tags
-                        if tavily_image_search:
-                            combined_output += ''.join(f'<img src="{image_url}" alt="Product Image" style="width:200px; height:auto; margin: 5px;" onerror="this.style.display=\'none\'"/> ' + "\n" for image_url in tavily_image_search)
-                        combined_output += "\n___\n\n" # Separator
-
-            except IndexError as e:
-                 print(f"  Error accessing data in row {i+1}: {e}. Check column indices and file structure. Skipping row.")
-                 combined_output += f"{output_row_str}\n\nError processing row: Invalid column index used.\n\n___\n\n"
-            except Exception as e:
-                print(f"  An unexpected error occurred processing row {i+1}: {e}")
-                combined_output += f"{output_row_str}\n\nError processing row: {e}\n\n___\n\n"
-
-            processed_count += 1 # Increment the counter only after attempting to process a row
-
-        return combined_output
-
-    def search(self):
-        """Main workflow: get data, get columns, process, save."""
+                    described.append((job, claude_text))
+
+        # --- Stage 3: Tavily image searches ---
+        if described:
+            logger.info("Searching Tavily for images for %d rows...", len(described))
+            image_results = self.run_unique(
+                self.tavily_image_search, [(job[1], claude_text) for job, claude_text in described],
+                key=lambda args: args[1])
+            for (job, claude_text), tavily_image_search in zip(described, image_results):
+                if isinstance(tavily_image_search, Exception):
+                    row_error(job, tavily_image_search)
+                    continue
+                # --- Combine Output ---
+                outputs[job[0]] = self.described_row_output(job[2], claude_text, tavily_image_search)
+                if progress_file is not None:
+                    # Checkpoint the row so a re-run after a crash doesn't search it again
+                    json.dump({"key": job[4], "row_str": job[2], "claude": claude_text,
+                               "images": list(tavily_image_search)}, progress_file, ensure_ascii=False)
+                    progress_file.write("\n")
+                    progress_file.flush()
+
+    def search(self, input_path=None, output_dir=None, column_preset=None):
+        """
+        Main workflow: get data, get columns, choose output folder, process and save.
+
+        Args:
+            input_path (str): Input file; asked for with a dialog when not given.
+            output_dir (str): Output folder; asked for with a dialog when not given.
+            column_preset (dict): Column selection passed on to get_column_indices.
+        """
         # 1. Get Input Data
-        upc_data = self.get_data()
+        upc_data = self.get_data(input_path)
         if upc_data is None:
             return # Exit if file loading failed or was cancelled
 
-        # 2. Get Column Mappings from User
-        column_indices = self.get_column_indices(upc_data.header)
-        if column_indices is None:
-            print("Column selection aborted or failed. Exiting.")
-            return # Exit if column selection failed or was cancelled
-
-        # 3. Process Data
-        print("\nStarting data processing...")
-        output_data = self.claude_tavily_extract(upc_data, column_indices)
-
-        # 4. Get Output Path
-        print("\nSelect the folder where the output file should be saved.")
-        outpath = askdirectory(title="Select Output Folder")
-        if not outpath:
-            print("No output folder selected. Exiting.")
-            return
-
-        # 5. Save Output
-        print(f"\nSaving output to directory: {outpath}")
-        # The save class handles creating the timestamped filename
-        csv_data.save(outpath, output_data)
-        print("Processing complete.")
+        # Released once the run ends, however it ends
+        with upc_data:
+            # 2. Get Column Mappings from User
+            column_indices = self.get_column_indices(upc_data.header, column_preset)
+            if column_indices is None:
+                logger.error("Column selection aborted or failed. Exiting.")
+                return # Exit if column selection failed or was cancelled
+
+            # 3. Get Output Path
+            outpath = output_dir
+            if outpath is None:
+                print("\nSelect the folder where the output file should be saved.")
+                outpath = self.ask_path("Select Output Folder", directory=True)
+            if not outpath:
+                logger.error("No output folder selected. Exiting.")
+                return
+
+            # 4. Process Data, writing each row's output as it is finished
+            logger.info("Saving output to directory: %s", outpath)
+            # Finished rows are checkpointed next to the output, named after the input file,
+            # unless caching is off (then every row is searched again)
+            progress_path = None
+            if self.use_cache:
+                input_stem = os.path.splitext(os.path.basename(upc_data.file_path))[0]
+                progress_path = os.path.join(outpath, f"{input_stem}.progress.jsonl")
+            # open_output_file handles creating the timestamped filename
+            with csv_data.open_output_file(outpath) as out_file:
+                logger.info("Starting data processing...")
+                finished = self.claude_tavily_extract(upc_data, column_indices, out_file, progress_path)
+                logger.info("Data successfully saved to '%s'", out_file.name)
+            if finished and progress_path is not None and os.path.exists(progress_path):
+                # Every row is in the output now; a later run of the same file starts fresh
+                os.remove(progress_path)
+            logger.info("Processing complete.")
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    generator = TavilyClaudeContentGen()
-    generator.search()
+    parser = argparse.ArgumentParser(description="Generate product content with Tavily and Claude.")
+    parser.add_argument("--input", help="Pipe-delimited input file (asked for with a dialog if omitted).")
+    parser.add_argument("--output-dir", help="Folder for the output file (asked for with a dialog if omitted).")
+    parser.add_argument("--search-type", type=int, choices=(1, 2),
+                        help="1: Item Number, Manufacturer, Description; 2: UPC/EAN.")
+    parser.add_argument("--upc-col", type=int, help="Index of the UPC/EAN column.")
+    parser.add_argument("--item-col", type=int, help="Index of the Item Number column.")
+    parser.add_argument("--manuf-col", type=int, help="Index of the Manufacturer Name column.")
+    parser.add_argument("--desc-col", type=int, help="Index of the Short Description column.")
+    parser.add_argument("--limit", type=int,
+                        help="Maximum number of rows to search (default: all rows).")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_ROWS,
+                        help=f"Rows searched at the same time (default {MAX_CONCURRENT_ROWS}).")
+    parser.add_argument("--window", type=int, default=WINDOW_ROWS,
+                        help=f"Rows searched and written per window (default {WINDOW_ROWS}).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached Tavily/Claude responses and the checkpoint of an unfinished run, and query the APIs again.")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Also log per-row progress (searches, cache hits, image counts).")
+    args = parser.parse_args()
+    # One stream handler for all progress messages; per-row traces are DEBUG
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s")
+    generator = TavilyClaudeContentGen(use_cache=not args.no_cache, processing_limit=args.limit,
+                                       concurrency=args.concurrency, window_size=args.window)
+    generator.search(input_path=args.input, output_dir=args.output_dir, column_preset={
+        'search_type': args.search_type, 'upc': args.upc_col, 'item_num': args.item_col,
+        'manuf': args.manuf_col, 'desc': args.desc_col})
@@ -24,7 +24,15 @@ The app maintains all user modifications throughout the workflow and provides a
 """
 
 import streamlit as st
+import pandas as pd
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+try:
+    # orjson builds the export several times faster and returns bytes, which download_button takes as-is
+    import orjson
+except ImportError:
+    orjson = None
 import tavily_extract
 import claude
 import taxonomy
@@ -44,9 +52,13 @@ Structure the response as valid JSON with the following fields:
 - Product_Title: concise product title
 - Product_Description: detailed product description
 - Product_Features: array of all features
+- Level_3_Category: the product category that best matches the specific type of product, copied exactly from the list of Level 3 Categories below
 
 Return only valid JSON without any formatting indicators or additional text.
 
+Level 3 Categories:
+{level_3_categories}
+
 Use the following product information to produce this content:
 """
 
@@ -56,58 +68,134 @@ When generating the product description highlight the products features and bene
 Also include a list of features of the product (in bullet format) and do not list the price for the product. 
 Finally include the UPC and the manufacturer name (and manufacturer code) if they can be found in the provided content. 
 
-Structure the response as valid JSON with the following fields:
-- UPC: item upc/ean code
-- Vendor: vendor/manufacturer name
-- Item_Number: manufacturer item/model number
-- Product_Title: concise product title
-- Product_Description: detailed product description that can be used on an eccomerce site, using marketing language
-- Product_Features: array of all features for the product, these should be based off of the attributes and should give the benefit of a given feature as well.
+Provide the content by calling the emit_product_content tool.
 
-Return only valid JSON without any formatting indicators or additional text.
-
-Use the following product information to produce this content:
+Use the following product information (JSON with the product and its attributes) to produce this content:
 """
 
-tavily_client = tavily_extract.upcExtract(api_key=st.secrets["TAVILY_API_KEY"])
-claude_client = claude.ClaudeQuery(api_key=st.secrets["ANTHROPIC_API_KEY"])
-taxonomy_classifier = taxonomy.ProductTaxonomyClassifier(api_key=st.secrets["ANTHROPIC_API_KEY"])
+# Tool Claude fills in for the final content, so the response arrives as structured fields
+product_content_tool = {
+    "name": "emit_product_content",
+    "description": "Record the product content for the AceHardware website.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "UPC": {"type": "string", "description": "item upc/ean code"},
+            "Vendor": {"type": "string", "description": "vendor/manufacturer name"},
+            "Item_Number": {"type": "string", "description": "manufacturer item/model number"},
+            "Product_Title": {"type": "string", "description": "concise product title"},
+            "Product_Description": {"type": "string", "description": "detailed product description that can be used on an eccomerce site, using marketing language"},
+            "Product_Features": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "all features for the product, these should be based off of the attributes and should give the benefit of a given feature as well",
+            },
+        },
+        "required": ["UPC", "Vendor", "Item_Number", "Product_Title", "Product_Description", "Product_Features"],
+    },
+}
+
+# API clients and the taxonomy are created on first use and shared by every session, so reruns
+# neither rebuild them nor re-read the secrets
+@st.cache_resource(show_spinner=False)
+def get_tavily_client():
+    return tavily_extract.upcExtract(api_key=st.secrets["TAVILY_API_KEY"])
+
+@st.cache_resource(show_spinner=False)
+def get_claude_client():
+    return claude.ClaudeQuery(api_key=st.secrets["ANTHROPIC_API_KEY"])
+
+@st.cache_resource(show_spinner=False)
+def get_taxonomy_classifier():
+    return taxonomy.ProductTaxonomyClassifier(api_key=st.secrets["ANTHROPIC_API_KEY"])
+
+@st.cache_resource(show_spinner=False)
+def get_initial_claude_query():
+    """initial_claude_query with the level 3 categories filled in."""
+    # The initial lookup also picks the level 3 category, so classification needs no Claude call of its own
+    return initial_claude_query.format(level_3_categories=get_taxonomy_classifier().get_level_3_options_text())
+
+@st.cache_data(show_spinner=False)
+def load_logo(path):
+    """Bytes of the sidebar logo, read from disk once."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+@st.cache_resource
+def background_executor():
+    """Worker threads for Claude calls started before the page that needs their result is shown."""
+    return ThreadPoolExecutor(max_workers=4)
+
+def prefetch(name, key, func, *args):
+    """
+    Start func(*args) in the background while the user reviews the current page, keeping the
+    future in session state under name. key identifies the inputs; nothing new is started if
+    a prefetch for the same key is already stored.
+    """
+    pending = st.session_state.get(name)
+    if pending is None or pending[0] != key:
+        st.session_state[name] = (key, background_executor().submit(func, *args))
+
+def take_prefetched(name, key):
+    """Remove the prefetch stored under name and return its future if it was started for key."""
+    pending = st.session_state.pop(name, None)
+    if pending is not None and pending[0] == key:
+        return pending[1]
+    return None
 
 # Configure page
 st.set_page_config(page_title="Product Processing App", layout="wide")
     
 
-# Initialize session state
-if 'page' not in st.session_state:
-    st.session_state.page = 'input'
-if 'current_step' not in st.session_state:
-    st.session_state.current_step = 1
-if 'product_data' not in st.session_state:
-    st.session_state.product_data = {}
+def _init_state():
+    """Initialize session state on a session's first run; later reruns leave it as is."""
+    st.session_state.setdefault('page', 'input')
+    st.session_state.setdefault('current_step', 1)
+    st.session_state.setdefault('product_data', {})
 
-# Mock functions to simulate processing steps
-def initial_product_lookup(upc_ean=None, manufacturer=None, item_number=None):
-  
+# Processing steps. Tavily lookups are cached for a day per input and Claude's answers by the
+# clients' own caches, so looking up the same product again (or going back and forth between
+# steps) doesn't repeat the Tavily and Claude calls.
+@st.cache_data(show_spinner=False, ttl=24 * 3600, max_entries=1000)
+def tavily_lookup(upc_ean=None, manufacturer=None, item_number=None):
+    """Tavily context for the product, by UPC/EAN or by manufacturer and item number."""
     if upc_ean:
-        tavily_search = tavily_client.run_upc_search(upc=upc_ean)
-        st.session_state.product_data['tavily_context'] = tavily_search
-        if tavily_search == "":
-            return ""
-        else:
-            return claude_client.search(initial_claude_query, tavily_search)
-    else:
-        tavily_search = tavily_client.run_vendor_item_search(item_num=item_number, manufacturer_name=manufacturer)
-        st.session_state.product_data['tavily_context'] = tavily_search
-        if tavily_search == "":
-            return ""
-        else:
-            return claude_client.search(initial_claude_query, tavily_search)
-
-def process_taxonomy(product_data):
-    return taxonomy_classifier.classify_product(str(product_data))
-
-def process_attributes(product_data, taxonomy_data):
-    return taxonomy_classifier.get_attributes(taxonomy_data, product_data)
+        return get_tavily_client().run_upc_search(upc=upc_ean)
+    return get_tavily_client().run_vendor_item_search(item_num=item_number, manufacturer_name=manufacturer)
+
+def initial_product_lookup(upc_ean=None, manufacturer=None, item_number=None, on_text=None):
+    """
+    Returns (Tavily context, Claude result); the result is "" when Tavily finds nothing
+    (or too little to be worth a Claude call).
+    on_text, if given, is called with Claude's response so far as it streams in.
+    
+    Not cached itself: st.cache_data would record the streaming UI calls and fail to replay
+    them into the caller's element. The Tavily context is cached by tavily_lookup, and
+    Claude's response by ClaudeQuery's response cache.
+    """
+    tavily_search = tavily_lookup(upc_ean=upc_ean, manufacturer=manufacturer, item_number=item_number)
+    if len(tavily_search) < tavily_extract.MIN_CONTEXT_CHARS:
+        return tavily_search, ""
+    return tavily_search, get_claude_client().search(get_initial_claude_query(), tavily_search, on_text=on_text)
+
+# The steps below also run on background_executor threads, which have no ScriptRunContext, so
+# they make no st.* calls: callers pass in the shared clients, and the answers are cached by the
+# classifier's and ClaudeQuery's own caches rather than st.cache_data.
+def process_taxonomy(product_data, classifier):
+    # Attributes are generated on their own page, so only the categories are needed here
+    level_3 = product_data[0].get('Level_3_Category') if product_data else None
+    if level_3:
+        return classifier.classify_from_level_3(level_3, str(product_data))
+    return classifier.classify_product_categories_only(str(product_data))
+
+def process_attributes(product_data, taxonomy_data, classifier):
+    return classifier.get_attributes(taxonomy_data, product_data)
+
+def process_content(initial_data, attributes_data, claude_client, on_text=None):
+    """Title, romance text and features for the product, filled in by Claude through product_content_tool."""
+    product_context = json.dumps({"product": initial_data[0], "attributes": attributes_data})
+    return claude_client.search_with_tool(final_claude_query, product_content_tool, product_context,
+                                          on_text=on_text)
 
 
 def validate_inputs(upc_ean, manufacturer, item_number):
@@ -154,12 +242,18 @@ def input_page():
             is_valid, message = validate_inputs(upc_ean, manufacturer, item_number)
             
             if is_valid:
+                preview = st.empty()
+                show_preview = lambda text: preview.code(text, language="json")
                 with st.spinner("Looking up product..."):
+                    # Normalized so differently typed inputs for the same product share a cache entry
                     if upc_ean and upc_ean.strip():
-                        result = initial_product_lookup(upc_ean=upc_ean.strip())
+                        tavily_context, result = initial_product_lookup(upc_ean=upc_ean.strip().upper(), on_text=show_preview)
                     else:
-                        result = initial_product_lookup(manufacturer=manufacturer.strip(), 
-                                                      item_number=item_number.strip())
+                        tavily_context, result = initial_product_lookup(manufacturer=manufacturer.strip().lower(), 
+                                                                        item_number=item_number.strip(),
+                                                                        on_text=show_preview)
+                preview.empty()
+                st.session_state.product_data['tavily_context'] = tavily_context
                 
                 # Check if product lookup failed
                 print("RESULT")
@@ -169,6 +263,8 @@ def input_page():
                 else:
                     # print(result)
                     st.session_state.product_data['initial'] = result
+                    # Start classifying right away so it overlaps with the page change
+                    st.session_state.taxonomy_future = background_executor().submit(process_taxonomy, result, get_taxonomy_classifier())
                     st.session_state.page = 'taxonomy'
                     st.session_state.current_step = 2
                     st.rerun()
@@ -179,22 +275,27 @@ def taxonomy_page():
     """Step 2: Review/modify taxonomy selection"""
     st.title("Step 2: Review/Modify Taxonomy Selection")
 
-    df = taxonomy_classifier.taxonomy_df
+    cat_tree = get_taxonomy_classifier().cat_tree
     
-    # Check if we need to process taxonomy (only if not submitting a form)
+    # Process taxonomy if needed, then render the page in the same run
     if 'taxonomy' not in st.session_state.product_data:
-        if 'processing_taxonomy' not in st.session_state:
-            st.session_state.processing_taxonomy = True
-            with st.spinner(f"Processing taxonomy for {st.session_state.product_data['initial'][0]['Product_Title']}..."):
-                print(st.session_state.product_data['initial'][0]['Product_Title'])
-                taxonomy_result = process_taxonomy(st.session_state.product_data['initial'])
-                st.session_state.product_data['taxonomy'] = taxonomy_result
-            del st.session_state.processing_taxonomy
-            st.rerun()
-            return  # Exit early to prevent form rendering during processing
+        with st.spinner(f"Processing taxonomy for {st.session_state.product_data['initial'][0]['Product_Title']}..."):
+            # Use the classification started by input_page if there is one
+            taxonomy_future = st.session_state.pop('taxonomy_future', None)
+            if taxonomy_future is not None:
+                taxonomy_result = taxonomy_future.result()
+            else:
+                taxonomy_result = process_taxonomy(st.session_state.product_data['initial'], get_taxonomy_classifier())
+            st.session_state.product_data['taxonomy'] = taxonomy_result
     
     current_taxonomy = st.session_state.product_data['taxonomy']
     
+    # Generate attributes for the suggested category while the user reviews it
+    if 'attributes' not in st.session_state.product_data and current_taxonomy.get('level_3_category'):
+        prefetch('attributes_prefetch', current_taxonomy['level_3_category'], process_attributes,
+                 st.session_state.product_data['tavily_context'], current_taxonomy['level_3_category'],
+                 get_taxonomy_classifier())
+    
     st.write(f"Product found: {st.session_state.product_data['initial'][0]['Product_Title']}")
     st.write("Review or modify the taxonomy classification below:")
     
@@ -203,8 +304,8 @@ def taxonomy_page():
     with col1:
         st.subheader("Category Classification")
         
-        # Get unique primary categories from dataframe
-        primary_options = sorted(df['level 1 category'].unique().tolist())
+        # Get primary categories from the category tree (already sorted)
+        primary_options = list(cat_tree)
         primary_options_with_empty = ["-- Select Level 1 Taxonomy --"] + primary_options
         
         # Find current Level 1 Taxonomy index
@@ -224,7 +325,7 @@ def taxonomy_page():
             level_1_category = primary_selection
         
         # Get secondary categories for selected Level 1 Taxonomy
-        secondary_options = sorted(df[df['level 1 category'] == level_1_category]['level 2 category'].unique().tolist())
+        secondary_options = list(cat_tree.get(level_1_category, {}))
         secondary_options_with_empty = ["-- Select Level 2 Taxonomy --"] + secondary_options
         
         # Find current Level 2 Taxonomy index
@@ -244,8 +345,7 @@ def taxonomy_page():
             level_2_category = secondary_selection
                 
         # Get Level 3 Taxonomys for selected primary and secondary categories
-        product_type_options = sorted(df[(df['level 1 category'] == level_1_category) & 
-                                    (df['level 2 category'] == level_2_category)]['level 3 category'].unique().tolist())
+        product_type_options = list(cat_tree.get(level_1_category, {}).get(level_2_category, ()))
         product_type_options_with_empty = ["-- Select Level 3 Taxonomy --"] + product_type_options
         
         # Find current Level 3 Taxonomy index
@@ -299,21 +399,29 @@ def attributes_page():
     """Step 3: Review/modify attribute population"""
     st.title("Step 3: Review/Modify Attribute Population")
     
-    # Check if we need to process attributes (only if not submitting a form)
+    # Process attributes if needed, then render the page in the same run
     if 'attributes' not in st.session_state.product_data:
-        if 'processing_attributes' not in st.session_state:
-            st.session_state.processing_attributes = True
-            with st.spinner("Processing attributes..."):
+        with st.spinner("Processing attributes..."):
+            level_3 = st.session_state.product_data['taxonomy']['level_3_category']
+            # Use the attributes prefetched on the taxonomy page if the category wasn't changed
+            attributes_future = take_prefetched('attributes_prefetch', level_3)
+            if attributes_future is not None:
+                st.session_state.product_data['attributes'] = attributes_future.result()
+            else:
                 st.session_state.product_data['attributes'] = process_attributes(
                     st.session_state.product_data['tavily_context'], 
-                    st.session_state.product_data['taxonomy']['level_3_category']
+                    level_3,
+                    get_taxonomy_classifier()
                 )
-            del st.session_state.processing_attributes
-            st.rerun()
-            return  # Exit early to prevent form rendering during processing
     
     current_attributes = st.session_state.product_data['attributes']
     
+    # Generate the content for these attributes while the user reviews them
+    if ('final' not in st.session_state.product_data
+            or st.session_state.get('final_attributes') != current_attributes):
+        prefetch('content_prefetch', current_attributes, process_content,
+                 st.session_state.product_data['initial'], current_attributes, get_claude_client())
+    
     # Get the selected level 3 category for display
     current_taxonomy = st.session_state.product_data['taxonomy']
     selected_level_3 = current_taxonomy.get('level_3_category')
@@ -322,32 +430,9 @@ def attributes_page():
         st.error("No Level 3 Taxonomy selected. Please go back to taxonomy page.")
         return
     
-    # Get the taxonomy dataframe to check for valid attribute values
-    df = taxonomy_classifier.taxonomy_df
-    
-    # Filter dataframe for the selected level 3 category (will get multiple rows)
-    level_3_rows = df[df['level 3 category'] == selected_level_3]
-    
-    # Create a mapping of attribute names to their valid values
-    attribute_valid_values = {}
-    for _, row in level_3_rows.iterrows():
-        if 'attribute' in row and 'valid attribute values' in row:
-            attr_name = row['attribute']
-            valid_values_str = row['valid attribute values']
-            
-            # Debug print
-            print(f"Processing attribute: {attr_name}, valid values: '{valid_values_str}'")
-            
-            # Check if valid_values_str is not empty (anything other than empty string means dropdown)
-            if valid_values_str and str(valid_values_str).strip() != "" and str(valid_values_str) != 'nan':
-                # Split by semicolon and clean up values
-                valid_values = [val.strip() for val in str(valid_values_str).split(';') if val.strip()]
-                attribute_valid_values[attr_name] = valid_values
-                print(f"  -> Created dropdown with options: {valid_values}")
-            else:
-                print(f"  -> Will be text input (empty valid values)")
-    
-    print(f"Final attribute_valid_values mapping: {attribute_valid_values}")
+    # Mapping of attribute names to their valid values; attributes with valid values get a
+    # dropdown, the rest are free-fill text inputs
+    attribute_valid_values = get_taxonomy_classifier().valid_values_for(selected_level_3)
 
     st.write(f"Product found: {st.session_state.product_data['initial'][0]['Product_Title']}")
     st.write(f"Review and modify the product attributes for **{selected_level_3}**:")
@@ -375,13 +460,9 @@ def attributes_page():
                 if attr_name in attribute_valid_values:
                     valid_values = attribute_valid_values[attr_name].copy()
                     
-                    print(f"Creating dropdown for {attr_name} with options: {valid_values}")
-                    print(f"Current value to select: '{attr_value}'")
-                    
                     # Add current value to options if it's not already there and not empty
                     if attr_value and str(attr_value).strip() and attr_value not in valid_values:
                         valid_values.insert(0, attr_value)
-                        print(f"  -> Added current value to options: {valid_values}")
                     
                     # Find the index of current value
                     try:
@@ -389,7 +470,6 @@ def attributes_page():
                             current_index = valid_values.index(attr_value)
                         else:
                             current_index = 0
-                        print(f"  -> Selected index: {current_index}")
                     except ValueError:
                         current_index = 0
                     
@@ -401,10 +481,8 @@ def attributes_page():
                         key=f"attr_{attr_name}",
                         label_visibility="collapsed"
                     )
-                    print(f"  -> Created selectbox for {attr_name}")
                 else:
                     # Create text input for attributes without valid values (free-fill)
-                    print(f"Creating text input for {attr_name} (free-fill)")
                     attribute_inputs[attr_name] = st.text_input(
                         label=attr_name,
                         value=attr_value if attr_value else "",
@@ -438,10 +516,24 @@ def description_and_features_page():
     """Step 4: Review/modify product title, romance text, and features"""
     st.title("Step 4: Review/Modify Product Title, Romance Text, and Features")
 
-    # Get data from existing session state
-    if 'final' not in st.session_state.product_data:
+    # Generate the content only if there is none yet or the attributes it was generated from
+    # were changed since; otherwise keep it (and any edits made to it) without calling Claude
+    if ('final' not in st.session_state.product_data
+            or st.session_state.get('final_attributes') != st.session_state.product_data['attributes']):
+        preview = st.empty()
         with st.spinner("Generating romance text and features..."):
-             st.session_state.product_data['final'] = claude_client.search(final_claude_query, str(st.session_state.product_data['initial']) + str(st.session_state.product_data['attributes']))
+             # Use the content prefetched on the attributes page if the attributes weren't changed
+             content_future = take_prefetched('content_prefetch', st.session_state.product_data['attributes'])
+             if content_future is not None:
+                 st.session_state.product_data['final'] = content_future.result()
+             else:
+                 st.session_state.product_data['final'] = process_content(st.session_state.product_data['initial'],
+                                                                          st.session_state.product_data['attributes'],
+                                                                          get_claude_client(),
+                                                                          on_text=lambda text: preview.code(text, language="json"))
+             st.session_state.final_attributes = st.session_state.product_data['attributes']
+             st.session_state.pop('temp_features', None) # Features come from the new content
+        preview.empty()
 
     # Get data from existing session state
     initial_data = st.session_state.product_data['initial']
@@ -475,52 +567,7 @@ def description_and_features_page():
     
     st.divider()
     
-    # Create layout with two columns for features
-    col1, col2 = st.columns([4, 1])
-    
-    # Form 2: Key Features (left column)
-    with col1:
-        with st.form("features_form"):
-            st.subheader("Key Features")
-            
-            # Display existing features with ability to edit
-            edited_features = []
-            for i, feature in enumerate(st.session_state.temp_features):
-                feature_text = st.text_input("", value=feature, key=f"feature_{i}", label_visibility="collapsed")
-                if feature_text.strip():  # Only add non-empty features
-                    edited_features.append(feature_text.strip())
-            
-            # Add new feature input
-            st.write("**Add New Feature:**")
-            new_feature = st.text_input("New Feature", key="new_feature_input")
-            
-            # Feature management and navigation buttons
-            col_a, col_b, col_c = st.columns([1, 1, 1])
-            
-            with col_a:
-                back_clicked = st.form_submit_button("← Back to Attributes")
-            
-            with col_b:
-                add_feature = st.form_submit_button("Add Feature")
-            
-            with col_c:
-                next_clicked = st.form_submit_button("View Final Results →", type="primary")
-    
-    # Remove buttons column - outside any form (right column)
-    with col2:
-        # Add spacing to align with features form content
-        st.write("")  # Align with Key Features header
-        st.write("")
-        
-        st.write("**Remove**")
-        for i, feature in enumerate(st.session_state.temp_features):
-            if st.button("✕", key=f"remove_btn_{i}", help="Remove this feature"):
-                st.session_state.temp_features.pop(i)
-                st.rerun()
-        
-        # Add spacing to align with new feature input
-        st.write("")
-        st.write("")
+    features_editor()
     
     # Handle form submissions
     if save_title_romance:
@@ -537,22 +584,47 @@ def description_and_features_page():
         
         st.success("Title and romance text saved!")
         st.rerun()
+
+
+def features_editor():
+    """
+    Key features editor of step 4: a single editable grid where features can be edited,
+    added and deleted in place. Edits are applied when the form is submitted.
+    """
+    # Form 2: Key Features
+    with st.form("features_form"):
+        st.subheader("Key Features")
+        
+        # One widget for the whole list; its key follows the features it was created from,
+        # so newly generated content starts a fresh grid
+        edited_df = st.data_editor(
+            pd.DataFrame({"Feature": st.session_state.temp_features}, dtype="string"),
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            key=f"features_editor_{hash(tuple(st.session_state.temp_features))}"
+        )
+        
+        # Navigation buttons
+        col_a, col_b = st.columns(2)
+        
+        with col_a:
+            back_clicked = st.form_submit_button("← Back to Attributes")
+        
+        with col_b:
+            next_clicked = st.form_submit_button("View Final Results →", type="primary")
     
     if back_clicked:
         st.session_state.page = 'attributes'
         st.session_state.current_step = 3
         st.rerun()
-
-    if add_feature and new_feature.strip():
-        st.session_state.temp_features.append(new_feature.strip())
-        st.rerun()
     
     if next_clicked:
-        # Save the edited features
-        final_features = edited_features.copy()
+        # Save the edited features, leaving out empty rows
+        final_features = [feature.strip() for feature in edited_df["Feature"].dropna() if feature.strip()]
         
         # Update the final data with modifications
-        updated_final = final_data.copy()
+        updated_final = st.session_state.product_data['final'].copy()
         updated_final[0]['Product_Features'] = final_features
         
         # Save to session state
@@ -591,8 +663,8 @@ def final_page():
                 st.subheader("Key Features")
                 features = final_data[0].get('Product_Features', [])
                 if features:
-                    for i, feature in enumerate(features, 1):
-                        st.write(f"{i}. {feature}")
+                    # One markdown element for the whole list instead of one per feature
+                    st.markdown("\n".join(f"{i}. {feature}" for i, feature in enumerate(features, 1)))
                 else:
                     st.write("No features available.")
         # Taxonomy Results
@@ -612,9 +684,10 @@ def final_page():
                 col1, col2 = st.columns(2)
                 attributes_list = list(attributes_data.items())
                 
-                for i, (attr_name, attr_value) in enumerate(attributes_list):
-                    with col1 if i % 2 == 0 else col2:
-                        st.write(f"**{attr_name}:** {attr_value if attr_value else 'N/A'}")
+                # One markdown element per column, alternating attributes between them
+                for col, column_attributes in ((col1, attributes_list[0::2]), (col2, attributes_list[1::2])):
+                    col.markdown("\n\n".join(f"**{attr_name}:** {attr_value if attr_value else 'N/A'}"
+                                              for attr_name, attr_value in column_attributes))
             else:
                 st.write("No attributes available.")
         
@@ -630,6 +703,10 @@ def final_page():
                 st.session_state.page = 'input'
                 st.session_state.current_step = 1
                 st.session_state.product_data = {}
+                st.session_state.pop('taxonomy_future', None)
+                st.session_state.pop('attributes_prefetch', None)
+                st.session_state.pop('content_prefetch', None)
+                st.session_state.pop('final_attributes', None)
                 # Clear temp features
                 if 'temp_features' in st.session_state:
                     del st.session_state.temp_features
@@ -637,8 +714,10 @@ def final_page():
         
         with col2:
             if st.button("📥 Export Results"):
-                import json
-                results_json = json.dumps(st.session_state.product_data, indent=2)
+                if orjson is not None:
+                    results_json = orjson.dumps(st.session_state.product_data, option=orjson.OPT_INDENT_2)
+                else:
+                    results_json = json.dumps(st.session_state.product_data, indent=2)
                 st.download_button(
                     label="Download JSON",
                     data=results_json,
@@ -657,27 +736,34 @@ def final_page():
             st.rerun()
 
 
+# Sidebar progress steps as (page key, label) pairs
+STEPS = (
+    ('input', '1. Initial Product Lookup'),
+    ('taxonomy', '2. Review/modify taxonomy selection'),
+    ('attributes', '3. Review/modify attribute population'),
+    ('content', '4. Review/modify product title, romance text, and features'),
+    ('final', '5. Final Results'),
+)
+
 # Main app logic
 def main():
+    _init_state()
     # Sidebar for navigation and status
     with st.sidebar:
-        st.image("assets/images/ace-hardware-logo.png", width=150)
+        st.image(load_logo("assets/images/ace-hardware-logo.png"), width=150)
         st.header("Generation Progress")
         # Progress indicator
-        steps = {
-            'input': '1. Initial Product Lookup',
-            'taxonomy': '2. Review/modify taxonomy selection',
-            'attributes': '3. Review/modify attribute population', 
-            'content': '4. Review/modify product title, romance text, and features',
-            'final': '5. Final Results'
-        }
-        
         current_page = st.session_state.page
         
-        for page_key, step_name in steps.items():
+        # Steps already completed, worked out once rather than per step
+        done_steps = {'input', *st.session_state.product_data}
+        if len(st.session_state.product_data) >= 5:
+            done_steps.add('final')
+        
+        for page_key, step_name in STEPS:
             if page_key == current_page:
                 st.write(f"🔄 **{step_name}**")
-            elif page_key in ['input'] or page_key in st.session_state.product_data or (page_key == 'final' and len(st.session_state.product_data) >= 5):
+            elif page_key in done_steps:
                 st.write(f"✅ {step_name}")
             else:
                 st.write(f"⏳ {step_name}")
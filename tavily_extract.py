@@ -1,14 +1,54 @@
 import asyncio
+import threading
+from collections import OrderedDict
 from tavily import AsyncTavilyClient
 import requests
 import os
+try:
+    # Optional: uvloop's event loop is a faster drop-in for the network-bound searches
+    import uvloop
+    _run = uvloop.run
+except ImportError:
+    _run = asyncio.run
+
+# Searches in flight at once across all rows of a run_many call
+MAX_CONCURRENT_SEARCHES = 32
+
+# A UPC search starts with its first UPC_PRIMARY_QUERIES queries at basic depth (faster and
+# cheaper) and only escalates to the full set of advanced queries when none of their results
+# scores at least HIGH_SCORE
+UPC_PRIMARY_QUERIES = 2
+HIGH_SCORE = 0.8
+
+# Text search outputs kept per upcExtract (most recently used first out when full)
+SEARCH_CACHE_SIZE = 2048
+
+# Search output shorter than this is too thin for Claude to describe the product from;
+# callers skip the Claude call instead of paying for it
+MIN_CONTEXT_CHARS = 200
 
 class upcExtract:
 
     def __init__(self, api_key: str):
-        self.tavily_client = AsyncTavilyClient(api_key) # Prod key tied to corp account, 1000 rpmin and 19000 rpmonth
+        self.api_key = api_key # Prod key tied to corp account, 1000 rpmin and 19000 rpmonth
+        self._tavily_client = None
+        # Search outputs keyed on the search inputs; each run_* call uses its own event
+        # loop, so results are cached rather than coroutines or futures
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        # UPC searches run, and how many of them escalated to advanced depth (for tuning HIGH_SCORE)
+        self.upc_searches = 0
+        self.upc_escalations = 0
 
-    async def search_by_upc_ean(self, upc):
+    @property
+    def tavily_client(self):
+        # Built on first search, so creating an upcExtract (e.g. at app start) costs nothing
+        if self._tavily_client is None:
+            self._tavily_client = AsyncTavilyClient(self.api_key)
+        return self._tavily_client
+
+    @staticmethod
+    def upc_queries(upc):
         # queries = [
         #     {"query": "What product corresponds to the UPC/EAN code " + upc + "?", "search_depth": "advanced", "max_results": 2, "include_images": False, "exclude_domains": [("www.acehardware.com")]},
         #     {"query": "product information UPC EAN " + upc + "", "search_depth": "advanced", "max_results": 2, "include_images": False, "exclude_domains": [("www.acehardware.com")]},
@@ -23,40 +63,169 @@ class upcExtract:
             {"query": f'"{upc}" product database specifications features', "search_depth": "advanced", "max_results": 3, "include_images": False, "exclude_domains": [("www.acehardware.com")]},
             {"query": f"EAN {upc} complete product details manufacturer", "search_depth": "advanced", "max_results": 3, "include_images": False, "exclude_domains": [("www.acehardware.com")]}
         ]
-        
-        # Perform the search queries concurrently
-        responses = await asyncio.gather(*[self.tavily_client.search(**q) for q in queries])
-        print("RESPONSES FROM TAVILY")
-        print(responses)
-        output = ""
-        # Filter URLs with a score greater than 0.5
-        for response in responses:
-            for result in response.get('results', []):
-                if result.get('score', 0) > 0.5:
-                    output += f"Item title: {result['title']}, Item Information: {result['content']}; "            
-        # print("TAVILY OUTPUT")
-        # print(output)
-        return output
+        return queries
 
-    async def search_by_vendor_item(self, item_num, manufacturer_name):
+    @staticmethod
+    def vendor_item_queries(item_num, manufacturer_name):
         queries = [
             {"query": f'Find product details for {manufacturer_name} item number "{item_num}"', "search_depth": "advanced", "max_results": 5, "exclude_domains": [("www.acehardware.com")]},
             {"query": f'"{manufacturer_name}" "{item_num}"', "search_depth": "advanced", "max_results": 5, "exclude_domains": [("www.acehardware.com")]},
             {"query": f'"{manufacturer_name}" "{item_num}" MPN', "search_depth": "advanced", "max_results": 5, "exclude_domains": [("www.acehardware.com")]}           
         ]
-        
-        # Perform the search queries concurrently
-        responses = await asyncio.gather(*[self.tavily_client.search(**q) for q in queries])
-        
-        output = ""
+        return queries
+
+    @staticmethod
+    def format_results(responses):
+        parts = []
+        # Different queries often return the same page; include each URL's content only once
+        seen_urls = set()
         # Filter URLs with a score greater than 0.5
         for response in responses:
             for result in response.get('results', []):
                 if result.get('score', 0) > 0.5:
-                    output += f"Item title: {result['title']}, Item Information: {result['content']}; "            
+                    url = result.get('url')
+                    if url is not None:
+                        if url in seen_urls:
+                            continue
+                        seen_urls.add(url)
+                    parts.append(f"Item title: {result['title']}, Item Information: {result['content']}; ")
+        # Join once rather than growing a string with += per result
+        return "".join(parts)
 
+    @staticmethod
+    def search_key(row):
+        """Cache key for a {'upc': ...} or {'item_num': ..., 'manufacturer_name': ...} row."""
+        if row.get('upc'):
+            return ('upc', row['upc'])
+        return ('vendor_item', row['item_num'], row['manufacturer_name'])
+
+    def cached_search(self, key):
+        with self._search_cache_lock:
+            output = self._search_cache.get(key)
+            if output is not None:
+                self._search_cache.move_to_end(key)
+            return output
+
+    def cache_search(self, key, output):
+        # Empty outputs aren't kept so the product is searched again next time
+        if not output:
+            return
+        with self._search_cache_lock:
+            self._search_cache[key] = output
+            self._search_cache.move_to_end(key)
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+
+    @classmethod
+    def upc_basic_queries(cls, upc):
+        return [dict(q, search_depth="basic") for q in cls.upc_queries(upc)[:UPC_PRIMARY_QUERIES]]
+
+    def record_upc_searches(self, searches, escalations):
+        with self._search_cache_lock:
+            self.upc_searches += searches
+            self.upc_escalations += escalations
+
+    @staticmethod
+    def has_high_score(responses):
+        return any(result.get('score', 0) >= HIGH_SCORE
+                   for response in responses for result in response.get('results', []))
+
+    async def search_by_upc_ean(self, upc):
+        key = self.search_key({'upc': upc})
+        output = self.cached_search(key)
+        if output is not None:
+            return output
+        # Perform the search queries concurrently: a basic pass first, advanced only if it falls short
+        responses = await asyncio.gather(*[self.tavily_client.search(**q) for q in self.upc_basic_queries(upc)])
+        escalate = not self.has_high_score(responses)
+        if escalate:
+            responses += await asyncio.gather(*[self.tavily_client.search(**q) for q in self.upc_queries(upc)])
+        self.record_upc_searches(1, int(escalate))
+        print("RESPONSES FROM TAVILY")
+        print(responses)
+        output = self.format_results(responses)
+        # print("TAVILY OUTPUT")
+        # print(output)
+        self.cache_search(key, output)
+        return output
+
+    async def search_by_vendor_item(self, item_num, manufacturer_name):
+        key = self.search_key({'item_num': item_num, 'manufacturer_name': manufacturer_name})
+        output = self.cached_search(key)
+        if output is not None:
+            return output
+        # Perform the search queries concurrently
+        responses = await asyncio.gather(*[self.tavily_client.search(**q) for q in self.vendor_item_queries(item_num, manufacturer_name)])
+        output = self.format_results(responses)
+        self.cache_search(key, output)
         return output
 
+    async def search_many(self, rows):
+        """
+        Runs the text searches for many products on one event loop.
+
+        Every row's queries go into a single gather, so queries from different rows run
+        side by side (at most MAX_CONCURRENT_SEARCHES at a time) instead of row by row.
+        UPC rows start with a basic-depth pass and run their advanced queries in a second
+        gather, only when the basic pass found no high-scoring result. Products already in the search cache, or
+        repeated in rows, are searched only once.
+
+        Args:
+            rows: One dict per product, either {'upc': ...} or {'item_num': ..., 'manufacturer_name': ...}
+
+        Returns:
+            list: The search output per row, in the order of rows. Rows whose searches failed
+                  get the exception instead.
+        """
+        keys = [self.search_key(row) for row in rows]
+        outputs = {}
+        pending = {} # key -> row to search for it
+        for key, row in zip(keys, rows):
+            if key in outputs or key in pending:
+                continue
+            output = self.cached_search(key)
+            if output is not None:
+                outputs[key] = output
+            else:
+                pending[key] = row
+        for key, output in zip(pending, await self._search_rows(list(pending.values()))):
+            outputs[key] = output
+            if not isinstance(output, Exception):
+                self.cache_search(key, output)
+        return [outputs[key] for key in keys]
+
+    async def _search_rows(self, rows):
+        """Searches every row (see search_many), without the cache."""
+        queries_by_row = [self.upc_queries(row['upc']) if row.get('upc')
+                          else self.vendor_item_queries(row['item_num'], row['manufacturer_name'])
+                          for row in rows]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+        responses_by_row = [[] for _ in rows]
+        failed = {}
+
+        async def bounded(q):
+            async with semaphore:
+                return await self.tavily_client.search(**q)
+
+        async def run_flat(flat):
+            results = await asyncio.gather(*[bounded(q) for _, q in flat], return_exceptions=True)
+            # Demultiplex the responses back to their rows
+            for (row_idx, _), response in zip(flat, results):
+                if isinstance(response, Exception):
+                    failed.setdefault(row_idx, response)
+                else:
+                    responses_by_row[row_idx].append(response)
+
+        upc_rows = {row_idx for row_idx, row in enumerate(rows) if row.get('upc')}
+        await run_flat([(row_idx, q) for row_idx, qs in enumerate(queries_by_row)
+                        for q in (self.upc_basic_queries(rows[row_idx]['upc']) if row_idx in upc_rows else qs)])
+        escalated = [row_idx for row_idx in sorted(upc_rows)
+                     if row_idx not in failed and not self.has_high_score(responses_by_row[row_idx])]
+        await run_flat([(row_idx, q) for row_idx in escalated for q in queries_by_row[row_idx]])
+        self.record_upc_searches(len(upc_rows), len(escalated))
+        return [failed[row_idx] if row_idx in failed else self.format_results(responses)
+                for row_idx, responses in enumerate(responses_by_row)]
+
     async def search_images(self, search_query):
         queries = [
             {"query": 'High resolution image of ' + str(search_query), "search_depth": "basic", "max_results": 20, "include_images": True, "exclude_domains": [("www.acehardware.com")]}
@@ -74,10 +243,13 @@ class upcExtract:
 
     # Convenience wrapper methods that can be called synchronously
     def run_upc_search(self, upc):
-        return asyncio.run(self.search_by_upc_ean(upc))
+        return _run(self.search_by_upc_ean(upc))
 
     def run_vendor_item_search(self, item_num, manufacturer_name):
-        return asyncio.run(self.search_by_vendor_item(item_num, manufacturer_name))
+        return _run(self.search_by_vendor_item(item_num, manufacturer_name))
 
     def run_image_search(self, search_query):
-        return asyncio.run(self.search_images(search_query))
\ No newline at end of file
+        return _run(self.search_images(search_query))
+
+    def run_many(self, rows):
+        return _run(self.search_many(rows))
\ No newline at end of file
@@ -1,7 +1,123 @@
 import pandas as pd
 import anthropic
+import asyncio
 from typing import List, Dict, Optional
 import json
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+try:
+    # Optional (installed with Streamlit): lets the taxonomy be cached as Parquet
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Products per batched Claude call; past a few dozen, each call slows down more than the
+# calls it replaces save
+CLASSIFY_BATCH_SIZE = 20
+
+# Below this many products, a Message Batches job's turnaround isn't worth its discount and
+# classify_products_with_batch_api uses the synchronous batched calls instead
+BATCH_API_MIN_PRODUCTS = 20
+
+# With at least this many level 3 categories, get_level_3_taxonomy picks level 1, then level 2,
+# then level 3 among that level 2's categories, instead of sending every level 3 category in
+# one prompt; smaller taxonomies keep the single call
+CASCADE_MIN_LEVEL_3_OPTIONS = 200
+
+# Retries of a Claude call that fails transiently (rate limit, overload, 5xx, timeout or dropped
+# connection); the SDK waits between them with jittered exponential backoff, honoring retry-after
+API_MAX_RETRIES = 5
+
+# Response token ceilings: a category answer is one name (the longest is about 15 tokens), and an
+# attributes answer needs roughly ATTRIBUTE_TOKENS per attribute plus the JSON object around them
+CATEGORY_MAX_TOKENS = 32
+ATTRIBUTE_TOKENS = 40
+ATTRIBUTES_BASE_TOKENS = 64
+
+# Level 3 and attribute answers kept per classifier, keyed on the normalized product
+# description (least recently used dropped first when full)
+CLASSIFICATION_CACHE_SIZE = 10_000
+
+# Longest wait for a Message Batches job before it is canceled (as claude.BATCH_TIMEOUT_SECONDS;
+# not imported from there, since claude.py pulls in Streamlit)
+BATCH_TIMEOUT_SECONDS = 2 * 3600
+
+# Instructions shared by the single and multi-product attribute prompts
+ATTRIBUTE_RULES = """For each attribute:
+- If it has a list of options, select the most appropriate value from those options
+- If it has no list, generate an appropriate value based on the product information
+- If you cannot determine an appropriate value, use 'N/A'
+- Do not include the sub brand in the brand name"""
+
+# The taxonomy columns the classifier uses; anything else in the file is never read
+TAXONOMY_COLUMNS = ['level 1 category', 'level 2 category', 'level 3 category', 'attribute', 'valid attribute values']
+
+def _read_taxonomy_csv(path: str) -> pd.DataFrame:
+    """
+    Read the TAXONOMY_COLUMNS of the taxonomy CSV into a raw DataFrame.
+    
+    With pyarrow installed, a zstd-compressed Parquet copy of the CSV is written next to it
+    on first start and read on later starts instead of parsing the CSV (only the needed
+    columns are read from it); it is rebuilt whenever the CSV is newer. The copy is written
+    to a temporary file and renamed into place, so a crashed or concurrent start never leaves
+    a partial one, and a copy that can't be read is ignored in favour of the CSV.
+    """
+    if pyarrow is None:
+        return pd.read_csv(path, usecols=TAXONOMY_COLUMNS)
+    
+    parquet_path = os.path.splitext(path)[0] + '.parquet'
+    try:
+        if os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            return pd.read_parquet(parquet_path, engine='pyarrow', columns=TAXONOMY_COLUMNS)
+    except FileNotFoundError:
+        pass  # No Parquet copy yet
+    except (OSError, pyarrow.ArrowInvalid) as e:
+        logger.warning("Could not read taxonomy Parquet copy %s, rebuilding it: %s", parquet_path, e)
+    
+    df = pd.read_csv(path, usecols=TAXONOMY_COLUMNS)
+    temp_path = f"{parquet_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        df.to_parquet(temp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(temp_path, parquet_path)
+    except (OSError, pyarrow.ArrowInvalid) as e:
+        logger.warning("Could not write taxonomy Parquet copy %s: %s", parquet_path, e)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    return df
+
+# The cleaned taxonomy and everything derived from it that doesn't depend on the classifier
+_TaxonomyResources = namedtuple('_TaxonomyResources',
+                                ['taxonomy_df', 'parents', 'attribute_subtrees', 'valid_values', 'cat_tree',
+                                 'level_3_options'])
+
+@functools.lru_cache(maxsize=None)
+def _load_taxonomy_resources(path: str) -> _TaxonomyResources:
+    """
+    Read, clean and index the taxonomy once per process; every classifier shares the result.
+    Callers must not modify the DataFrame or the dicts in place.
+    """
+    taxonomy_df = ProductTaxonomyClassifier._load_and_clean_taxonomy(_read_taxonomy_csv(path))
+    # level 3 category -> (level 1, level 2), -> (attribute options, prompt lines),
+    # and -> {attribute: dropdown options}
+    parents, attribute_subtrees, valid_values = ProductTaxonomyClassifier._build_level_3_indices(taxonomy_df)
+    return _TaxonomyResources(
+        taxonomy_df=taxonomy_df,
+        parents=parents,
+        attribute_subtrees=attribute_subtrees,
+        valid_values=valid_values,
+        # level 1 -> level 2 -> sorted tuple of level 3 categories, with every level sorted
+        cat_tree=ProductTaxonomyClassifier._build_category_tree(taxonomy_df),
+        # (sorted options, prompt block, options set, lowercase index), see _get_level_3_options
+        level_3_options=ProductTaxonomyClassifier._build_level_3_options(parents),
+    )
 
 class ProductTaxonomyClassifier:
     """
@@ -11,6 +127,11 @@ class ProductTaxonomyClassifier:
     Level 1 -> Level 2 -> Level 3 -> Attributes with valid values
     """
     
+    # One synchronous client (and so one connection pool) per API key, shared by every
+    # classifier, so a new classifier doesn't open new connections
+    _clients: Dict[str, anthropic.Anthropic] = {}
+    _clients_lock = threading.Lock()
+    
     def __init__(self, api_key: str):
         """
         Initialize the classifier with API key and taxonomy dataframe.
@@ -21,49 +142,174 @@ class ProductTaxonomyClassifier:
                 ['level 1 category', 'level 2 category', 'level 3 category', 
                  'attribute', 'valid attribute values']
         """
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.taxonomy_df = self._load_and_clean_taxonomy(pd.read_csv('resources/taxonomy.csv'))
+        self.client = self._shared_client(api_key)
+        self._api_key = api_key  # For the AsyncAnthropic client of each concurrent run
+        # Loaded and indexed once per process, so creating a classifier doesn't re-read the CSV;
+        # per-product lookups are dict lookups, not DataFrame scans
+        resources = _load_taxonomy_resources('resources/taxonomy.csv')
+        self.taxonomy_df = resources.taxonomy_df
+        self._parents = resources.parents
+        self._attribute_subtrees = resources.attribute_subtrees
+        self._valid_values = resources.valid_values
+        self.cat_tree = resources.cat_tree
+        self._level_3_options = resources.level_3_options
         self.model = "claude-sonnet-4-20250514"
+        # Answers already paid for, so repeated descriptions (SKU variants, re-runs) skip the API:
+        # normalized description -> level 3, and (level 3, normalized description) -> attributes
+        self._level_3_cache = OrderedDict()
+        self._attributes_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
 
-    def _load_and_clean_taxonomy(self, csv_df):
-        """Load and clean the taxonomy CSV file."""
-        df = csv_df
-        
+    @classmethod
+    def _shared_client(cls, api_key: str) -> anthropic.Anthropic:
+        """Return the process-wide client for api_key, creating it on first use."""
+        with cls._clients_lock:
+            client = cls._clients.get(api_key)
+            if client is None:
+                client = cls._clients[api_key] = anthropic.Anthropic(api_key=api_key, max_retries=API_MAX_RETRIES)
+            return client
+    
+    @staticmethod
+    def _load_and_clean_taxonomy(csv_df):
+        """Clean the taxonomy CSV DataFrame (into a new DataFrame; csv_df is left as it is)."""
         # Replace NaN values with empty strings
-        df = df.fillna('')
+        df = csv_df.fillna('')
         
-        # Convert all relevant columns to strings
-        string_columns = ['level 1 category', 'level 2 category', 'level 3 category', 'attribute', 'valid attribute values']
-        for col in string_columns:
-            df[col] = df[col].astype(str)
+        # Convert all relevant columns to strings and replace any 'nan' strings (from
+        # conversion) with empty strings, on all the columns at once
+        df[TAXONOMY_COLUMNS] = df[TAXONOMY_COLUMNS].astype(str).replace('nan', '')
         
-        # Replace any 'nan' strings (from conversion) with empty strings
-        for col in string_columns:
-            df[col] = df[col].replace('nan', '')
+        if pyarrow is not None:
+            # Arrow-backed strings: smaller than Python string objects, and drop_duplicates and
+            # comparisons run in Arrow compute kernels; iterating still yields plain str
+            df = df.astype({col: 'string[pyarrow]' for col in TAXONOMY_COLUMNS})
         
         return df
         
-    def _make_api_call(self, system_prompt: str, user_message: str) -> str:
+    @staticmethod
+    def _build_category_tree(df) -> Dict[str, Dict[str, tuple]]:
+        """Index the category hierarchy so pickers can list children without filtering the DataFrame."""
+        categories = df[['level 1 category', 'level 2 category', 'level 3 category']].drop_duplicates()
+        tree = {}
+        for level_1, level_2, level_3 in zip(categories['level 1 category'],
+                                             categories['level 2 category'],
+                                             categories['level 3 category']):
+            tree.setdefault(level_1, {}).setdefault(level_2, set()).add(level_3)
+        return {
+            level_1: {level_2: tuple(sorted(tree[level_1][level_2])) for level_2 in sorted(tree[level_1])}
+            for level_1 in sorted(tree)
+        }
+        
+    @staticmethod
+    def _parse_valid_values(valid_values) -> List[str]:
+        """Parse a 'valid attribute values' cell: a JSON list, or semicolon-separated values."""
+        # Handle case where valid_values might be a string representation of a list
+        if isinstance(valid_values, str):
+            try:
+                # Try to parse as JSON/list
+                if valid_values.startswith('[') and valid_values.endswith(']'):
+                    return json.loads(valid_values)
+                # Assume semicolon-separated values
+                return [v.strip() for v in valid_values.split(';')]
+            except:
+                # If parsing fails, treat as single value
+                return [valid_values]
+        return [valid_values]
+    
+    @classmethod
+    def _build_level_3_indices(cls, df) -> tuple:
+        """
+        Index the taxonomy by level 3 category in one pass over its rows, parsing each
+        category's valid attribute values once.
+        
+        Returns:
+            tuple: (level 3 -> (level 1, level 2) of its first row,
+                    level 3 -> (dict of attribute -> valid values list, list of "attribute: values" prompt lines),
+                    level 3 -> dict of attribute -> dropdown options, for attributes that have valid values)
         """
-        Make a single API call to Claude.
+        parents = {}
+        attribute_rows = {}  # level 3 -> unique (attribute, valid values) pairs, in taxonomy order
+        for level_1, level_2, level_3, attribute, valid_values in zip(
+                df['level 1 category'], df['level 2 category'], df['level 3 category'],
+                df['attribute'], df['valid attribute values']):
+            parents.setdefault(level_3, (level_1, level_2))
+            attribute_rows.setdefault(level_3, {}).setdefault((attribute, valid_values), None)
+        
+        subtrees = {}
+        dropdowns = {}
+        for level_3, pairs in attribute_rows.items():
+            # Build the attributes and their options for the API call
+            attribute_options = {}
+            attribute_list = []
+            # And the semicolon-separated dropdown options of the attributes that have them
+            attribute_dropdowns = {}
+            for attribute, valid_values in pairs:
+                valid_values_list = cls._parse_valid_values(valid_values)
+                attribute_options[attribute] = valid_values_list
+                attribute_list.append(f"{attribute}: {', '.join(valid_values_list)}")
+                values = [value.strip() for value in valid_values.split(';') if value.strip()]
+                if values:
+                    attribute_dropdowns[attribute] = values
+            subtrees[level_3] = (attribute_options, attribute_list)
+            dropdowns[level_3] = attribute_dropdowns
+        return parents, subtrees, dropdowns
+    
+    def _request_params(self, system_prompt: str, user_message: str, max_tokens: int = 500,
+                        tool: Optional[Dict] = None) -> Dict:
+        """
+        Messages API parameters for one call to Claude, shared by the single, concurrent and
+        Message Batches paths.
+        
+        The system prompt is marked for prompt caching, so callers should keep everything
+        that is the same across calls (such as the level 3 category list) in it and only
+        the per-product text in user_message.
         
         Args:
             system_prompt (str): System prompt for the API call
             user_message (str): User message to send
+            max_tokens (int): Maximum tokens in Claude's response
+            tool (Dict): Optional tool definition ({"name", "description", "input_schema"})
+                Claude must answer by calling
+            
+        Returns:
+            Dict: Keyword arguments for messages.create
+        """
+        params = {
+            "model": self.model,
+            "system": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+            "max_tokens": max_tokens,
+            "messages": [{
+                "role": "user",
+                "content": user_message
+            }]
+        }
+        if tool is not None:
+            params["tools"] = [tool]
+            params["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return params
+    
+    @staticmethod
+    def _tool_input(message, tool: Dict) -> Dict:
+        """The input of the tool call in a response to a _request_params(..., tool) call (a copy, safe to modify)."""
+        tool_input = next((block.input for block in message.content if block.type == "tool_use"), None)
+        if tool_input is None:
+            raise ValueError(f"no {tool['name']} call in the response (stop reason: {message.stop_reason})")
+        return dict(tool_input)
+    
+    def _make_api_call(self, system_prompt: str, user_message: str, max_tokens: int = 500) -> str:
+        """
+        Make a single API call to Claude (see _request_params).
+        
+        Args:
+            system_prompt (str): System prompt for the API call
+            user_message (str): User message to send
+            max_tokens (int): Maximum tokens in Claude's response
             
         Returns:
             str: Claude's response
         """
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                system=system_prompt,
-                max_tokens=500,
-                messages=[{
-                    "role": "user",
-                    "content": user_message
-                }]
-            )
+            response = self.client.messages.create(**self._request_params(system_prompt, user_message, max_tokens))
             
             assistant_message = response.content[0].text.strip()
             return assistant_message
@@ -71,43 +317,290 @@ class ProductTaxonomyClassifier:
         except Exception as e:
             raise Exception(f"API call failed: {str(e)}")
     
+    def _make_tool_call(self, system_prompt: str, user_message: str, max_tokens: int, tool: Dict) -> Dict:
+        """
+        Make a single API call to Claude that must answer by calling tool (see _request_params).
+        
+        Args:
+            system_prompt (str): System prompt for the API call
+            user_message (str): User message to send
+            max_tokens (int): Maximum tokens in Claude's response
+            tool (Dict): Tool definition ({"name", "description", "input_schema"})
+            
+        Returns:
+            Dict: The tool input Claude sent (a copy, safe to modify)
+        """
+        try:
+            response = self.client.messages.create(**self._request_params(system_prompt, user_message, max_tokens, tool))
+            return self._tool_input(response, tool)
+            
+        except Exception as e:
+            raise Exception(f"API call failed: {str(e)}")
+    
+    @staticmethod
+    def _prompt_description(product_description: str) -> str:
+        """
+        Description as sent to Claude: stripped, with runs of whitespace (newlines, tabs,
+        padding from CSV cells) collapsed to single spaces. Case is kept, since brand and
+        model names carry meaning.
+        """
+        return " ".join(product_description.split())
+    
+    @staticmethod
+    def _normalize_description(product_description: str) -> str:
+        """Cache key form of a description: lowercased, with runs of whitespace collapsed."""
+        return " ".join(product_description.lower().split())
+    
+    def _cached(self, cache: OrderedDict, key):
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    def _cache(self, cache: OrderedDict, key, value):
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > CLASSIFICATION_CACHE_SIZE:
+                cache.popitem(last=False)
+    
+    def _split_cached(self, cache: OrderedDict, keys: List, items: List) -> tuple:
+        """
+        Look up each key of a multi-product call in cache.
+        
+        Returns:
+            tuple: (dict of key -> cached answer, dict of key -> first item whose key isn't
+                    cached); each key appears once, so repeated products are asked once
+        """
+        answers = {}
+        pending = {}
+        for key, item in zip(keys, items):
+            if key in answers or key in pending:
+                continue
+            answer = self._cached(cache, key)
+            if answer is not None:
+                answers[key] = answer
+            else:
+                pending[key] = item
+        return answers, pending
+    
+    def _attributes_key(self, level_3_taxonomy: str, product_description: str) -> tuple:
+        return (level_3_taxonomy, self._normalize_description(product_description))
+    
+    def _complete_attributes(self, level_3_taxonomy: str, product_description: str, attributes: Dict) -> Dict:
+        """Fill in 'N/A' for attributes Claude left out and cache the answer; returns attributes."""
+        # Validate that all expected attributes are present
+        for attribute in self._get_attribute_subtree(level_3_taxonomy)[0]:
+            attributes.setdefault(attribute, 'N/A')
+        # All-'N/A' answers aren't kept so the product is asked again
+        if any(value != 'N/A' for value in attributes.values()):
+            self._cache(self._attributes_cache, self._attributes_key(level_3_taxonomy, product_description),
+                        dict(attributes))
+        return attributes
+    
+    @staticmethod
+    def _strip_code_fence(response: str) -> str:
+        """Remove a ```json (or bare ```) fence Claude sometimes wraps around JSON output."""
+        response = response.strip()
+        if response.startswith('```json'):
+            response = response.replace('```json', '').replace('```', '').strip()
+        elif response.startswith('```'):
+            response = response.replace('```', '').strip()
+        return response
+    
+    @classmethod
+    def _build_level_3_options(cls, parents: Dict[str, tuple]) -> tuple:
+        """Build the _get_level_3_options tuple from the level 3 -> parents index."""
+        # Get all unique level 3 categories, sorted so the prompt is byte-for-byte the same on
+        # every run whatever the row order of the taxonomy file. Remove empty strings if any
+        level_3_options = sorted(cat for cat in parents if cat.strip())
+        return (level_3_options, chr(10).join([f"- {cat}" for cat in level_3_options]),
+                frozenset(level_3_options), cls._lowercase_index(level_3_options))
+    
+    def _get_level_3_options(self) -> tuple:
+        """
+        Return the level 3 categories, the prompt block listing them, a set of them for
+        membership tests and their lowercase index for _find_closest_match. Built once per
+        process when the taxonomy is loaded.
+        
+        Returns:
+            tuple: (sorted list of level 3 categories, newline-joined "- category" lines,
+                    frozenset of level 3 categories, dict of lowercased category -> category)
+        """
+        return self._level_3_options
+    
+    def get_level_3_options_text(self) -> str:
+        """
+        Get the prompt block listing every level 3 category, for prompts that ask for
+        a level 3 category alongside other output.
+        
+        Returns:
+            str: Newline-joined "- category" lines
+        """
+        return self._get_level_3_options()[1]
+    
     def get_level_3_taxonomy(self, product_description: str) -> str:
         """
         Get level 3 category directly for a product description.
         
+        Taxonomies with CASCADE_MIN_LEVEL_3_OPTIONS or more level 3 categories are classified
+        one level at a time (see _get_level_3_cascaded) so no prompt lists them all.
+        Answers are cached per normalized description.
+        
         Args:
             product_description (str): Description of the product to classify
             
         Returns:
             str: Selected level 3 category
         """
-        # Get all unique level 3 categories
-        level_3_options = self.taxonomy_df['level 3 category'].unique().tolist()
-        # Remove empty strings if any
-        level_3_options = [cat for cat in level_3_options if cat.strip()]
+        key = self._normalize_description(product_description)
+        level_3 = self._cached(self._level_3_cache, key)
+        if level_3 is not None:
+            return level_3
+        
+        if len(self._get_level_3_options()[0]) >= CASCADE_MIN_LEVEL_3_OPTIONS:
+            level_3 = self._get_level_3_cascaded(product_description)
+        else:
+            selected_category = self._make_api_call(*self._level_3_prompt(product_description))
+            level_3 = self._validate_level_3(selected_category)
+        self._cache(self._level_3_cache, key, level_3)
+        return level_3
+    
+    def _get_level_3_cascaded(self, product_description: str) -> str:
+        """
+        Get the level 3 category with three small API calls: level 1 from every level 1
+        category, level 2 from that level 1's children, then level 3 from that level 2's.
+        
+        Args:
+            product_description (str): Description of the product to classify
+            
+        Returns:
+            str: Selected level 3 category
+        """
+        level_1 = self._select_category(1, [cat for cat in self.cat_tree if cat.strip()], product_description)
+        level_2_tree = self.cat_tree[level_1]
+        level_2 = self._select_category(2, [cat for cat in level_2_tree if cat.strip()], product_description)
+        level_3 = self._select_category(3, [cat for cat in level_2_tree[level_2] if cat.strip()], product_description)
+        return self._validate_level_3(level_3)
+    
+    def _select_category(self, level: int, options: List[str], product_description: str) -> str:
+        """Ask Claude to pick one category of the given level from options (a sorted list)."""
+        if len(options) == 1:
+            return options[0]
+        
+        # The options list is the same for every product under the same parent, so it goes in
+        # the (cached) system prompt
+        system_prompt = f"""You are a product classification expert. Your task is to select the most appropriate Level {level} category for a given product description from a provided list of options.
+
+Analyze the product description carefully and select the category that best matches the type of product being described.
+
+Return ONLY the exact category name from the list, nothing else. Do not add explanations, quotes, or additional text.
+
+Available Level {level} Categories:
+""" + chr(10).join([f"- {cat}" for cat in options])
+        
+        user_message = f"""Product Description: {self._prompt_description(product_description)}
+
+Select the most appropriate Level {level} category from the list for this product."""
+        
+        selected_category = self._make_api_call(system_prompt, user_message, max_tokens=CATEGORY_MAX_TOKENS)
+        if selected_category in options:
+            return selected_category
+        return self._find_closest_match(selected_category, options)
+    
+    def _level_3_prompt(self, product_description: str) -> tuple:
+        """Return the (system prompt, user message, max tokens) asking for one product's level 3 category."""
+        level_3_options_text = self._get_level_3_options()[1]
         
         system_prompt = """You are a product classification expert. Your task is to select the most appropriate Level 3 category for a given product description from a provided list of options. 
 
 Level 3 categories are the most specific product categories in our taxonomy. Analyze the product description carefully and select the category that best matches the specific type of product being described.
 
-Return ONLY the exact category name from the list, nothing else. Do not add explanations, quotes, or additional text."""
-        
-        user_message = f"""Product Description: {product_description}
+Return ONLY the exact category name from the list, nothing else. Do not add explanations, quotes, or additional text.
 
 Available Level 3 Categories:
-{chr(10).join([f"- {cat}" for cat in level_3_options])}
+""" + level_3_options_text
+        
+        user_message = f"""Product Description: {self._prompt_description(product_description)}
 
 Select the most appropriate Level 3 category from the list for this product."""
-        
-        selected_category = self._make_api_call(system_prompt, user_message)
+        return system_prompt, user_message, CATEGORY_MAX_TOKENS
+    
+    def _validate_level_3(self, selected_category: str) -> str:
+        """Return Claude's level 3 answer if it is a known category, otherwise the closest one."""
+        level_3_options, _, level_3_set, level_3_lower = self._get_level_3_options()
         
         # Validate the response is in the available options
-        if selected_category not in level_3_options:
+        if selected_category not in level_3_set:
             # Try to find a close match
-            selected_category = self._find_closest_match(selected_category, level_3_options)
+            selected_category = self._find_closest_match(selected_category, level_3_options, level_3_lower)
         
         return selected_category
     
+    def get_level_3_taxonomies(self, product_descriptions: List[str]) -> List[str]:
+        """
+        Get level 3 categories for several product descriptions using one API call per
+        CLASSIFY_BATCH_SIZE products. Answers come from and go to the same cache as
+        get_level_3_taxonomy's, and repeated descriptions are sent once.
+        
+        Args:
+            product_descriptions (List[str]): Descriptions of the products to classify
+            
+        Returns:
+            List[str]: Selected level 3 category for each product, in input order
+        """
+        keys = [self._normalize_description(description) for description in product_descriptions]
+        categories, pending = self._split_cached(self._level_3_cache, keys, product_descriptions)
+        pending_keys, pending_descriptions = list(pending), list(pending.values())
+        for start in range(0, len(pending_descriptions), CLASSIFY_BATCH_SIZE):
+            chunk_keys = pending_keys[start:start + CLASSIFY_BATCH_SIZE]
+            chunk = pending_descriptions[start:start + CLASSIFY_BATCH_SIZE]
+            for key, level_3 in zip(chunk_keys, self._request_level_3_taxonomies(chunk)):
+                categories[key] = level_3
+                self._cache(self._level_3_cache, key, level_3)
+        return [categories[key] for key in keys]
+    
+    def _request_level_3_taxonomies(self, product_descriptions: List[str]) -> List[str]:
+        """
+        Ask for the level 3 categories of at most CLASSIFY_BATCH_SIZE products in one API call.
+        Falls back to one get_level_3_taxonomy call per product if the response cannot be parsed.
+        """
+        if len(product_descriptions) == 1:
+            return [self.get_level_3_taxonomy(product_descriptions[0])]
+        
+        level_3_options_text = self._get_level_3_options()[1]
+        
+        system_prompt = """You are a product classification expert. Your task is to select the most appropriate Level 3 category for each of several numbered product descriptions from a provided list of options.
+
+Level 3 categories are the most specific product categories in our taxonomy. Analyze each product description carefully and select the category that best matches the specific type of product being described.
+
+Return ONLY a JSON array containing exactly one category name from the list per product, in the same order as the products. Do not add explanations or additional text.
+
+Available Level 3 Categories:
+""" + level_3_options_text
+        
+        products_text = "\n".join(f"{i}. {self._prompt_description(description)}" for i, description in enumerate(product_descriptions, 1))
+        user_message = f"""Product Descriptions:
+{products_text}
+
+Select the most appropriate Level 3 category from the list for each of the {len(product_descriptions)} products."""
+        
+        # Roughly 30 tokens per category name plus the array syntax
+        response = self._make_api_call(system_prompt, user_message,
+                                       max_tokens=100 + 30 * len(product_descriptions))
+        
+        try:
+            selected_categories = json.loads(self._strip_code_fence(response))
+            if not isinstance(selected_categories, list) or len(selected_categories) != len(product_descriptions):
+                raise ValueError("category count does not match product count")
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.warning("Could not parse batched level 3 response (%s); classifying products individually", e)
+            return [self.get_level_3_taxonomy(description) for description in product_descriptions]
+        
+        # Validate each response is in the available options
+        return [self._validate_level_3(str(category)) for category in selected_categories]
+    
     def get_parent_categories(self, level_3_category: str) -> tuple:
         """
         Get the parent level 1 and level 2 categories for a given level 3 category.
@@ -118,24 +611,46 @@ Select the most appropriate Level 3 category from the list for this product."""
         Returns:
             tuple: (level_1_category, level_2_category)
         """
-        # Find the row with this level 3 category
-        matching_rows = self.taxonomy_df[
-            self.taxonomy_df['level 3 category'] == level_3_category
-        ]
-        
-        if matching_rows.empty:
+        parents = self._parents.get(level_3_category)
+        if parents is None:
             raise ValueError(f"No matching row found for level 3 category: {level_3_category}")
+        return parents
+    
+    def _get_attribute_subtree(self, level_3_taxonomy: str) -> tuple:
+        """
+        Return the attributes of a level 3 category with their parsed valid values.
+        Built for every category when the classifier is created.
         
-        # Get the first matching row (they should all have the same level 1 and 2 for a given level 3)
-        first_row = matching_rows.iloc[0]
-        level_1_category = first_row['level 1 category']
-        level_2_category = first_row['level 2 category']
+        Args:
+            level_3_taxonomy (str): Selected level 3 category
+            
+        Returns:
+            tuple: (dict of attribute -> valid values list, list of "attribute: values" prompt lines)
+        """
+        subtree = self._attribute_subtrees.get(level_3_taxonomy)
+        if subtree is None:
+            raise ValueError(f"No attributes found for level 3: {level_3_taxonomy}")
+        return subtree
+    
+    def valid_values_for(self, level_3_category: str) -> Dict[str, List[str]]:
+        """
+        Get the dropdown options of each attribute of a level 3 category that has valid values.
+        Free-fill attributes (no valid values) are left out. Parsed when the taxonomy is loaded.
         
-        return level_1_category, level_2_category
+        Args:
+            level_3_category (str): Selected level 3 category
+            
+        Returns:
+            Dict[str, List[str]]: Attribute name -> its semicolon-separated valid values, stripped
+        """
+        return self._valid_values.get(level_3_category, {})
     
     def get_attributes(self, level_3_taxonomy: str, product_description: str) -> Dict[str, str]:
         """
         Get attributes and their values for a given level 3 category using a single API call.
+        Claude answers through a tool whose schema lists the attributes (with their valid
+        values as enums), so the answer arrives as a dict with no JSON to parse.
+        Answers are cached per level 3 category and normalized description.
         
         Args:
             level_3_taxonomy (str): Selected level 3 category
@@ -144,115 +659,256 @@ Select the most appropriate Level 3 category from the list for this product."""
         Returns:
             Dict[str, str]: Dictionary mapping attribute names to selected values
         """
-        print("ATTRIBUTE PRODUCT DESCRIPTION")
-        print(product_description)
-        # Get attributes for the given level 3
-        attributes_df = self.taxonomy_df[
-            self.taxonomy_df['level 3 category'] == level_3_taxonomy
-        ][['attribute', 'valid attribute values']].drop_duplicates()
-        
-        if attributes_df.empty:
-            raise ValueError(f"No attributes found for level 3: {level_3_taxonomy}")
+        attributes = self._cached(self._attributes_cache, self._attributes_key(level_3_taxonomy, product_description))
+        if attributes is not None:
+            # A copy, so callers editing the result don't change the cached answer
+            return dict(attributes)
         
-        # Build the attributes and their options for the API call
-        attribute_options = {}
-        attribute_list = []
+        logger.debug("Attribute product description: %s", product_description)
+        attributes = self._make_tool_call(*self._attributes_tool_prompt(level_3_taxonomy, product_description))
+        return self._complete_attributes(level_3_taxonomy, product_description, attributes)
+    
+    def _attributes_schema(self, level_3_taxonomy: str) -> Dict:
+        """JSON schema of one product's attribute values: a required string per attribute,
+        limited to its valid values (and 'N/A') where it has them."""
+        properties = {}
+        for attribute, valid_values in self._get_attribute_subtree(level_3_taxonomy)[0].items():
+            # Unique, in taxonomy order (enum values must not repeat), plus the 'N/A' answer
+            options = list(dict.fromkeys(value for value in valid_values + ['N/A'] if value))
+            properties[attribute] = {"type": "string", "enum": options} if len(options) > 1 else {"type": "string"}
+        return {"type": "object", "properties": properties, "required": list(properties)}
+    
+    def _attributes_tool_prompt(self, level_3_taxonomy: str, product_description: str) -> tuple:
+        """Return the (system prompt, user message, max tokens, tool) asking for one product's attribute values."""
+        system_prompt = """You are a product classification expert. Based on the product information, choose the most appropriate value for each attribute and record them with the record_attributes tool.
+
+""" + ATTRIBUTE_RULES
         
-        for _, row in attributes_df.iterrows():
-            attribute = row['attribute']
-            valid_values = row['valid attribute values']
-            
-            # Handle case where valid_values might be a string representation of a list
-            if isinstance(valid_values, str):
-                try:
-                    # Try to parse as JSON/list
-                    if valid_values.startswith('[') and valid_values.endswith(']'):
-                        valid_values_list = json.loads(valid_values)
-                    else:
-                        # Assume semicolon-separated values
-                        valid_values_list = [v.strip() for v in valid_values.split(';')]
-                except:
-                    # If parsing fails, treat as single value
-                    valid_values_list = [valid_values]
-            else:
-                valid_values_list = [valid_values]
-            
-            attribute_options[attribute] = valid_values_list
-            attribute_list.append(f"{attribute}: {', '.join(valid_values_list)}")
+        schema = self._attributes_schema(level_3_taxonomy)
+        tool = {
+            "name": "record_attributes",
+            "description": f"Record the attribute values of a {level_3_taxonomy} product.",
+            "input_schema": schema,
+        }
         
-        system_prompt = """You are a product classification expert. Based on the product information, choose the most appropriate values for each attribute.
-
-For each attribute:
-- If a list of options is provided, select the most appropriate value from those options
-- If no list is provided, generate an appropriate value based on the product information
-- If you cannot determine an appropriate value, use 'N/A'
-- Do not include the sub brand in the brand name
+        user_message = f"""Product Description: {self._prompt_description(product_description)}
 
-Return your response in the following JSON format:
-{
-    "attribute_name": "selected_value",
-    "another_attribute": "selected_value"
-}
+Record the most appropriate value of each attribute for this product."""
+        return system_prompt, user_message, self._attributes_max_tokens(len(schema["properties"])), tool
+    
+    def _attributes_batch_tool_prompt(self, level_3_taxonomy: str, product_descriptions: List[str]) -> tuple:
+        """
+        Return the (system prompt, user message, max tokens, tool) asking for the attribute
+        values of several numbered products in one call. The tool takes a list of
+        {"index", "attributes"} entries whose attributes use _attributes_tool_prompt's schema.
+        """
+        system_prompt = """You are a product classification expert. Based on the product information, choose the most appropriate value for each attribute, for each of several numbered products, and record them with the record_products_attributes tool (one entry per product, with its number as the index).
 
-Return ONLY the JSON object, nothing else."""
+""" + ATTRIBUTE_RULES
         
-        # Build the attribute options text
-        attributes_text = "\n".join([f"- {attr}" for attr in attribute_list])
+        schema = self._attributes_schema(level_3_taxonomy)
+        tool = {
+            "name": "record_products_attributes",
+            "description": f"Record the attribute values of several {level_3_taxonomy} products.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "products": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"index": {"type": "integer"}, "attributes": schema},
+                            "required": ["index", "attributes"],
+                        },
+                    },
+                },
+                "required": ["products"],
+            },
+        }
         
-        user_message = f"""Product Description: {product_description}
-
-Please select appropriate values for each of the following attributes:
+        products_text = "\n".join(f"{i}) {self._prompt_description(description)}" for i, description in enumerate(product_descriptions, 1))
+        user_message = f"""Product Descriptions:
+{products_text}
 
-{attributes_text}
-
-Return your selections in JSON format as specified."""
+Record the most appropriate value of each attribute for each of the {len(product_descriptions)} products."""
+        # The single-product ceiling per product, plus room for each entry's index wrapper
+        max_tokens = (self._attributes_max_tokens(len(schema["properties"])) + 16) * len(product_descriptions)
+        return system_prompt, user_message, max_tokens, tool
+    
+    @staticmethod
+    def _attributes_max_tokens(attribute_count: int) -> int:
+        """Response token ceiling for one product's attributes JSON."""
+        return ATTRIBUTES_BASE_TOKENS + ATTRIBUTE_TOKENS * attribute_count
+    
+    def get_attributes_batch(self, level_3_taxonomy: str, product_descriptions: List[str]) -> List[Dict[str, str]]:
+        """
+        Get attributes for several products in the same level 3 category using a single API call,
+        with the same tool schema and cache as get_attributes. Repeated descriptions are sent once.
+        Falls back to one get_attributes call per product if the batched answer doesn't cover every product.
         
-        response = self._make_api_call(system_prompt, user_message)
+        Args:
+            level_3_taxonomy (str): Level 3 category shared by the products
+            product_descriptions (List[str]): Descriptions of the products (at most CLASSIFY_BATCH_SIZE)
+            
+        Returns:
+            List[Dict[str, str]]: Attribute name -> selected value for each product, in input order
+        """
+        keys = [self._attributes_key(level_3_taxonomy, description) for description in product_descriptions]
+        answers, pending = self._split_cached(self._attributes_cache, keys, product_descriptions)
+        if len(pending) == 1:
+            (key, description), = pending.items()
+            answers[key] = self.get_attributes(level_3_taxonomy, description)
+        elif pending:
+            for key, attributes in zip(pending, self._request_attributes_batch(level_3_taxonomy, list(pending.values()))):
+                answers[key] = attributes
+        # Copies, so products sharing an answer (or the cache) don't share a dict
+        return [dict(answers[key]) for key in keys]
+    
+    def _request_attributes_batch(self, level_3_taxonomy: str, product_descriptions: List[str]) -> List[Dict[str, str]]:
+        """One record_products_attributes call for the products (see get_attributes_batch)."""
+        tool_prompt = self._attributes_batch_tool_prompt(level_3_taxonomy, product_descriptions)
+        try:
+            entries = self._make_tool_call(*tool_prompt)['products']
+            by_index = {int(entry['index']): entry['attributes'] for entry in entries}
+            if set(by_index) != set(range(1, len(product_descriptions) + 1)):
+                raise ValueError("product indices do not match the products sent")
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Could not use batched attributes response (%s); classifying products individually", e)
+            return [self.get_attributes(level_3_taxonomy, description) for description in product_descriptions]
         
-        # Parse the JSON response
+        return [self._complete_attributes(level_3_taxonomy, description, dict(by_index[i]))
+                for i, description in enumerate(product_descriptions, 1)]
+    
+    async def _make_api_call_async(self, client, system_prompt: str, user_message: str,
+                                   max_tokens: int = 500) -> str:
+        """Async counterpart of _make_api_call, sent through the given AsyncAnthropic client."""
         try:
-            # Clean the response in case there are extra characters
-            response = response.strip()
-            if response.startswith('```json'):
-                response = response.replace('```json', '').replace('```', '').strip()
-            elif response.startswith('```'):
-                response = response.replace('```', '').strip()
+            response = await client.messages.create(**self._request_params(system_prompt, user_message, max_tokens))
+            return response.content[0].text.strip()
             
-            selected_attributes = json.loads(response)
+        except Exception as e:
+            raise Exception(f"API call failed: {str(e)}")
+    
+    async def _make_tool_call_async(self, client, system_prompt: str, user_message: str,
+                                    max_tokens: int, tool: Dict) -> Dict:
+        """Async counterpart of _make_tool_call, sent through the given AsyncAnthropic client."""
+        try:
+            response = await client.messages.create(**self._request_params(system_prompt, user_message, max_tokens, tool))
+            return self._tool_input(response, tool)
             
-            # Validate that all expected attributes are present
-            for attribute in attribute_options.keys():
-                if attribute not in selected_attributes:
-                    selected_attributes[attribute] = 'N/A'
+        except Exception as e:
+            raise Exception(f"API call failed: {str(e)}")
+    
+    async def _classify_concurrently(self, product_descriptions: List[str], max_concurrency: int) -> List[Dict]:
+        """
+        Run classify_product's two API calls for every product, at most max_concurrency calls
+        at a time, with classify_product's prompts and caches.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        # A client per run: its connection pool belongs to this run's event loop
+        async with anthropic.AsyncAnthropic(api_key=self._api_key, max_retries=API_MAX_RETRIES) as client:
+            async def call(method, prompt):
+                # prompt is the positional arguments after the client
+                async with semaphore:
+                    return await method(client, *prompt)
             
-            return selected_attributes
+            async def classify_one(product_description):
+                key = self._normalize_description(product_description)
+                level_3 = self._cached(self._level_3_cache, key)
+                if level_3 is None:
+                    level_3 = self._validate_level_3(
+                        await call(self._make_api_call_async, self._level_3_prompt(product_description)))
+                    self._cache(self._level_3_cache, key, level_3)
+                attributes = self._cached(self._attributes_cache, self._attributes_key(level_3, product_description))
+                if attributes is not None:
+                    attributes = dict(attributes)
+                else:
+                    attributes = self._complete_attributes(level_3, product_description, await call(
+                        self._make_tool_call_async, self._attributes_tool_prompt(level_3, product_description)))
+                # Derive level 1 and 2 from the dataframe (no API calls)
+                level_1, level_2 = self.get_parent_categories(level_3)
+                return {
+                    'product_description': product_description,
+                    'level_1_category': level_1,
+                    'level_2_category': level_2,
+                    'level_3_category': level_3,
+                    'attributes': attributes
+                }
             
-        except json.JSONDecodeError:
-            # Fallback: if JSON parsing fails, return N/A for all attributes
-            print(f"Warning: Could not parse JSON response: {response}")
-            return {attr: 'N/A' for attr in attribute_options.keys()}
+            return await asyncio.gather(*[classify_one(description) for description in product_descriptions])
     
-    def _find_closest_match(self, response: str, valid_options: List[str]) -> str:
+    def _make_batch_api_calls(self, requests: List[Dict], poll_interval: float = 5.0,
+                              timeout: float = BATCH_TIMEOUT_SECONDS) -> List[Optional[object]]:
+        """
+        Send one request per _request_params dict through the Message Batches API and wait
+        for the batch to end.
+        
+        Args:
+            requests (List[Dict]): Messages API parameters per request
+            poll_interval (float): Seconds to wait between batch status checks
+            timeout (float): Seconds to wait for the batch to end; past that it is canceled and
+                TimeoutError is raised
+            
+        Returns:
+            List[Optional[Message]]: Claude's message per request, or None where the request did not succeed
+        """
+        batch = self.client.messages.batches.create(requests=[
+            {"custom_id": str(i), "params": params}
+            for i, params in enumerate(requests)
+        ])
+        deadline = time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                try:
+                    self.client.messages.batches.cancel(batch.id)
+                except Exception as e:
+                    logger.warning("Could not cancel batch %s: %s", batch.id, e)
+                raise TimeoutError(f"Batch {batch.id} did not end within {timeout:.0f}s; canceled")
+            time.sleep(poll_interval)
+            batch = self.client.messages.batches.retrieve(batch.id)
+        
+        responses = [None] * len(requests)
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                responses[int(entry.custom_id)] = entry.result.message
+            else:
+                logger.warning("Batch request %s %s", entry.custom_id, entry.result.type)
+        return responses
+    
+    @staticmethod
+    def _lowercase_index(valid_options: List[str]) -> Dict[str, str]:
+        """Map each lowercased option to the first option with that lowercase form, in list order."""
+        lowered = {}
+        for option in valid_options:
+            lowered.setdefault(option.lower(), option)
+        return lowered
+    
+    def _find_closest_match(self, response: str, valid_options: List[str],
+                            lowered: Optional[Dict[str, str]] = None) -> str:
         """
         Find the closest match from valid options if exact match not found.
         
         Args:
             response (str): Claude's response
             valid_options (List[str]): List of valid options
+            lowered (Dict[str, str]): _lowercase_index(valid_options), if already built
             
         Returns:
             str: Best matching option from the valid list
         """
         response_lower = response.lower().strip()
+        if lowered is None:
+            lowered = self._lowercase_index(valid_options)
         
         # First try exact match (case insensitive)
-        for option in valid_options:
-            if option.lower() == response_lower:
-                return option
+        option = lowered.get(response_lower)
+        if option is not None:
+            return option
         
         # Then try partial match
-        for option in valid_options:
-            if response_lower in option.lower() or option.lower() in response_lower:
+        for option_lower, option in lowered.items():
+            if response_lower in option_lower or option_lower in response_lower:
                 return option
         
         # If no match found, return the first option as fallback
@@ -261,7 +917,8 @@ Return your selections in JSON format as specified."""
     def classify_product(self, product_description: str) -> Dict:
         """
         Complete classification of a product through all taxonomy levels.
-        Uses exactly 2 API calls total: 1 for level 3 category, 1 for all attributes.
+        Uses 2 API calls total: 1 for level 3 category, 1 for all attributes (level 3 takes
+        3 calls on taxonomies large enough to be classified level by level).
         
         Args:
             product_description (str): Description of the product to classify
@@ -293,7 +950,7 @@ Return your selections in JSON format as specified."""
     def classify_product_categories_only(self, product_description: str) -> Dict:
         """
         Classification of a product through taxonomy levels only (no attributes).
-        Uses only one API call.
+        Uses only one API call (three on taxonomies classified level by level).
         
         Args:
             product_description (str): Description of the product to classify
@@ -316,4 +973,197 @@ Return your selections in JSON format as specified."""
             }
             
         except Exception as e:
-            raise Exception(f"Classification failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Classification failed: {str(e)}")
+    
+    def classify_from_level_3(self, level_3_category: str, product_description: str = '') -> Dict:
+        """
+        Classification of a product whose level 3 category was already chosen by Claude
+        in another prompt (see get_level_3_options_text). Makes no API calls.
+        
+        Args:
+            level_3_category (str): Level 3 category from Claude's response
+            product_description (str): Description of the product
+            
+        Returns:
+            Dict: Classification results without attributes
+        """
+        try:
+            # Validate the category is in the available options
+            level_3_category = self._validate_level_3(level_3_category)
+            
+            # Derive level 1 and 2 from the dataframe (no API calls)
+            level_1, level_2 = self.get_parent_categories(level_3_category)
+            
+            return {
+                'product_description': product_description,
+                'level_1_category': level_1,
+                'level_2_category': level_2,
+                'level_3_category': level_3_category
+            }
+            
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
+    
+    def classify_products_batch(self, product_descriptions: List[str]) -> List[Dict]:
+        """
+        Complete classification of several products through all taxonomy levels.
+        Products are sent CLASSIFY_BATCH_SIZE at a time: one API call per batch for the
+        level 3 categories, then one attributes call per batch of products sharing a level 3
+        category, instead of two calls per product.
+        
+        Args:
+            product_descriptions (List[str]): Descriptions of the products to classify
+            
+        Returns:
+            List[Dict]: Complete classification results, in input order
+        """
+        try:
+            level_3_categories = self.get_level_3_taxonomies(product_descriptions)
+            
+            # Group products by level 3 so each group shares one attribute list
+            groups = {}
+            for i, level_3 in enumerate(level_3_categories):
+                groups.setdefault(level_3, []).append(i)
+            
+            attributes = [None] * len(product_descriptions)
+            for level_3, indices in groups.items():
+                for start in range(0, len(indices), CLASSIFY_BATCH_SIZE):
+                    chunk = indices[start:start + CLASSIFY_BATCH_SIZE]
+                    for i, selected in zip(chunk, self.get_attributes_batch(
+                            level_3, [product_descriptions[i] for i in chunk])):
+                        attributes[i] = selected
+            
+            results = []
+            for product_description, level_3, product_attributes in zip(product_descriptions, level_3_categories, attributes):
+                # Derive level 1 and 2 from the dataframe (no API calls)
+                level_1, level_2 = self.get_parent_categories(level_3)
+                results.append({
+                    'product_description': product_description,
+                    'level_1_category': level_1,
+                    'level_2_category': level_2,
+                    'level_3_category': level_3,
+                    'attributes': product_attributes
+                })
+            return results
+            
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
+    
+    def classify_products_concurrent(self, product_descriptions: List[str], max_concurrency: int = 10) -> List[Dict]:
+        """
+        Complete classification of several products, as classify_product does for one, with
+        the API calls of different products in flight at the same time (up to max_concurrency).
+        Each product still makes its level 3 call before its attributes call.
+        
+        Args:
+            product_descriptions (List[str]): Descriptions of the products to classify
+            max_concurrency (int): Most API calls in flight at once
+            
+        Returns:
+            List[Dict]: Complete classification results, in input order
+        """
+        try:
+            return asyncio.run(self._classify_concurrently(product_descriptions, max_concurrency))
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
+    
+    def classify_products_with_batch_api(self, product_descriptions: List[str]) -> List[Dict]:
+        """
+        Complete classification of a large set of products through the Message Batches API,
+        for jobs that can wait for results: one batch of level 3 requests, then one batch
+        of attribute requests. Batched requests cost half as much and don't count against
+        the per-minute rate limits. Requests that fail in a batch are retried synchronously;
+        a batch that doesn't end within BATCH_TIMEOUT_SECONDS is canceled and the
+        classification fails.
+        
+        Fewer than BATCH_API_MIN_PRODUCTS products go through classify_products_batch instead.
+        
+        Args:
+            product_descriptions (List[str]): Descriptions of the products to classify
+            
+        Returns:
+            List[Dict]: Complete classification results, in input order
+        """
+        if len(product_descriptions) < BATCH_API_MIN_PRODUCTS:
+            return self.classify_products_batch(product_descriptions)
+        
+        try:
+            # Batch 1: level 3 categories of the products not already cached
+            keys = [self._normalize_description(description) for description in product_descriptions]
+            categories, pending = self._split_cached(self._level_3_cache, keys, product_descriptions)
+            if pending:
+                messages = self._make_batch_api_calls([self._request_params(*self._level_3_prompt(description))
+                                                       for description in pending.values()])
+                for (key, description), message in zip(pending.items(), messages):
+                    if message is None:
+                        categories[key] = self.get_level_3_taxonomy(description)
+                        continue
+                    categories[key] = self._validate_level_3(message.content[0].text.strip())
+                    self._cache(self._level_3_cache, key, categories[key])
+            level_3_categories = [categories[key] for key in keys]
+            
+            # Batch 2: attributes of the products not already cached, through get_attributes' tool
+            keys = [self._attributes_key(level_3, description)
+                    for description, level_3 in zip(product_descriptions, level_3_categories)]
+            answers, pending = self._split_cached(self._attributes_cache, keys, product_descriptions)
+            if pending:
+                tool_prompts = [self._attributes_tool_prompt(key[0], description)
+                                for key, description in pending.items()]
+                messages = self._make_batch_api_calls([self._request_params(*tool_prompt) for tool_prompt in tool_prompts])
+                for (key, description), tool_prompt, message in zip(pending.items(), tool_prompts, messages):
+                    level_3 = key[0]
+                    try:
+                        if message is None:
+                            raise ValueError("batch request did not succeed")
+                        attributes = self._tool_input(message, tool_prompt[3])
+                    except ValueError:
+                        answers[key] = self.get_attributes(level_3, description)
+                        continue
+                    answers[key] = self._complete_attributes(level_3, description, attributes)
+            
+            results = []
+            for product_description, level_3, key in zip(product_descriptions, level_3_categories, keys):
+                attributes = dict(answers[key])
+                # Derive level 1 and 2 from the dataframe (no API calls)
+                level_1, level_2 = self.get_parent_categories(level_3)
+                results.append({
+                    'product_description': product_description,
+                    'level_1_category': level_1,
+                    'level_2_category': level_2,
+                    'level_3_category': level_3,
+                    'attributes': attributes
+                })
+            return results
+            
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")
+    
+    def classify_products_categories_only(self, product_descriptions: List[str]) -> List[Dict]:
+        """
+        Classification of several products through taxonomy levels only (no attributes).
+        Uses one API call for the whole list instead of one per product.
+        
+        Args:
+            product_descriptions (List[str]): Descriptions of the products to classify
+            
+        Returns:
+            List[Dict]: Classification results without attributes, in input order
+        """
+        try:
+            # Get level 3 categories for every product (single API call)
+            level_3_categories = self.get_level_3_taxonomies(product_descriptions)
+            
+            results = []
+            for product_description, level_3 in zip(product_descriptions, level_3_categories):
+                # Derive level 1 and 2 from the dataframe (no API calls)
+                level_1, level_2 = self.get_parent_categories(level_3)
+                results.append({
+                    'product_description': product_description,
+                    'level_1_category': level_1,
+                    'level_2_category': level_2,
+                    'level_3_category': level_3
+                })
+            return results
+            
+        except Exception as e:
+            raise Exception(f"Classification failed: {str(e)}")